@@ -17,4 +17,4 @@ __version__ = "1.0.7"
 __copyright__ = "Copyright © 2005-2017 Red Hat, Inc."
 __license__ = "GPL"
 __all__ = ("config", "distro", "dump", "errors", "i18n", "logging", "path", "predicate",
-           "procedural", "rawinput", "sessions", "tree", "utils", "version")
+           "procedural", "rawinput", "sessions", "snapshot", "tree", "utils", "version")
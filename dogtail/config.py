@@ -45,9 +45,32 @@ class _Config:
     actionDelay(float):
     The delay after an action is executed.
 
+    syncMode (str):
+    How dogtail waits for applications after actions, clicks and key combos.
+    "delay" (the default) sleeps for actionDelay (defaultDelay after key
+    combos). "events" listens to AT-SPI events and carries on as soon as none
+    have arrived for 50 ms, waiting at most as long as the delay would have
+    (see dogtail.utils.waitForIdle).
+
     typingDelay(float):
     The delay after a character is typed on the keyboard.
 
+    typingMode (str):
+    How Node.typeText paces the keys it types. "delay" (the default) sleeps
+    for typingDelay after every key. "events" sends the keys back to back and
+    only waits when more than typingWindow of them have not been acknowledged
+    by the node's text-changed:insert or text-caret-moved events yet. If the
+    acknowledgements stop for actionDelay seconds, the rest is typed with
+    typingDelay.
+
+    typingWindow (int):
+    Number of keys typed with typingMode "events" that may be waiting for
+    their acknowledgement at any time (default 8).
+
+    typingInsertThreshold (int):
+    Length from which Node.typeText with method "auto" inserts the text
+    through the EditableText interface instead of typing it (default 32).
+
     runInterval(float):
     The interval at which dogtail.utils.run() and dogtail.procedural.run()
     check to see if the application has started up.
@@ -66,11 +89,68 @@ class _Config:
     Number of times to retry when a search fails.
 
     searchShowingOnly (boolean):
-    Whether to only search among nodes that are currently being shown.
+    Whether to only search among nodes that are currently being shown. Nothing
+    below a node that isn't showing is searched either.
+
+    searchCollection (boolean):
+    Whether searches with predicates that declare their roles should let the
+    application do the matching through the AT-SPI Collection interface, where
+    the application supports it, instead of walking the tree from dogtail
+    (default True).
+
+    searchOrder (str):
+    Order in which recursive searches visit the tree when no order is given,
+    "dfs" (depth-first, the default) or "bfs" (breadth-first, finding the
+    shallowest match first).
+
+    searchPrefetch (boolean):
+    Whether searches walking the tree fetch the properties the predicate reads
+    (Predicate.requiredProperties) with one batch of concurrent calls for each
+    list of children they read (see tree.prefetchAll) rather than reading them
+    one at a time (default False).
+
+    searchWaitMode (str):
+    How findChild waits for a node that is not there yet. "poll" (the default)
+    repeats the whole search every searchBackoffDuration seconds. "events"
+    listens to the AT-SPI children-changed, name and showing events below the
+    search root and only checks the nodes they touch, returning as soon as a
+    match appears. Both give up after searchCutoffCount * searchBackoffDuration
+    seconds.
+
+    cacheMode (str):
+    How values read from applications are cached on nodes. "off" (the
+    default) reads everything from the application every time and listens to
+    no events. "validated" caches roles, state sets and window ids during each
+    search attempt, tagged with a generation that AT-SPI state-changed, role
+    change and window events move on, and reads a value again once it is out
+    of date; pending events are dispatched once when each attempt starts, and
+    reads outside of searches are not cached. "aggressive" caches them (and
+    children, also as walked by searches, search paths and, until anything in
+    the application changes, extents) at all times, listening to
+    children-changed, property-change and bounds-changed events as well, and
+    does not dispatch events itself, so changes are only noticed when
+    something else does (e.g. waiting or searching with searchWaitMode
+    "events"). Toolkits that don't emit state-changed events can leave cached
+    states out of date.
 
     defaultDelay (float):
     Default time in seconds to sleep when delaying.
 
+    trajectoryDuration (float):
+    How long in seconds a mouse motion with trajectory (drags included) takes
+    (default 0.3).
+
+    trajectoryRate (int):
+    Number of motion events per second along a trajectory (default 120).
+
+    trajectoryMinSteps (int):
+    Number of motion events a trajectory has at least, however short its
+    duration, unless it is shorter in pixels (default 10).
+
+    trajectoryEasing (str):
+    How motion events are spaced along a trajectory: "linear", "easeIn",
+    "easeOut" or "easeInOut" (the default, slow at both ends).
+
     childrenLimit (int):
     When there are a very large number of children of a node, only return
     this many, starting with the first.
@@ -145,7 +225,11 @@ class _Config:
 
         # Timing and Limits
         "actionDelay": 1.0,
+        "syncMode": "delay",
         "typingDelay": 0.1,
+        "typingMode": "delay",
+        "typingWindow": 8,
+        "typingInsertThreshold": 32,
         "runInterval": 0.5,
         "runTimeout": 30,
         "doubleClickDelay": 0.1,
@@ -153,7 +237,16 @@ class _Config:
         "searchWarningThreshold": 3,
         "searchCutoffCount": 20,
         "searchShowingOnly": False,
+        "searchWaitMode": "poll",
+        "searchCollection": True,
+        "searchOrder": "dfs",
+        "searchPrefetch": False,
+        "cacheMode": "off",
         "defaultDelay": 0.5,
+        "trajectoryDuration": 0.3,
+        "trajectoryRate": 120,
+        "trajectoryMinSteps": 10,
+        "trajectoryEasing": "easeInOut",
         "childrenLimit": 100,
         "gtk4Offset": (12, 12), # offset to add to ui element position with shadows DISABLED (bigger and variable offset present otherwise, disable shadows!)
 
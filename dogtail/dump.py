@@ -37,7 +37,7 @@ def plain(node, output=None):
         for action in actions_keys:
             do_dump(node.actions[action], depth + 1)
 
-        for child in node.children:
+        for child in node.iterChildren():
             crawl(child, depth + 1)
 
 
@@ -81,7 +81,7 @@ def verbose(node, output=None):
 
     def crawl(node, depth):
         do_dump(node, depth)
-        for child in node.children:
+        for child in node.iterChildren():
             crawl(child, depth + 1)
 
     def dump_std_out(item, depth):
@@ -126,6 +126,44 @@ class TranslatableString(object):
             self.untranslatedString = untranslatedString.encode("utf-8")
 
         self.translatedStrings = translate(untranslatedString)
+        self.__compileMatchPlan()
+
+
+    def __compileMatchPlan(self):
+        """
+        Work out once how matchedBy compares strings. Each translation (and the
+        original string) is used as a regular expression anchored at the end,
+        with a leading "*" and all parentheses escaped. Where that expression
+        has no other special characters it can only match the string itself
+        (or the string followed by a newline, which "$" also accepts), so those
+        are simply looked up; the others are compiled here once.
+        """
+
+        def isLiteral(candidate):
+            if candidate.startswith("*"):
+                candidate = candidate[1:]
+            return not any(char in candidate for char in ".^$*+?{}[]\\|")
+
+        self.literalMatches = []
+        self.patternMatches = []
+        for candidate in [str(string) for string in self.translatedStrings] + [str(self.untranslatedString)]:
+            if isLiteral(candidate):
+                for literal in (candidate, candidate + "\n"):
+                    if literal not in self.literalMatches:
+                        self.literalMatches.append(literal)
+                continue
+
+            pattern = candidate + "$"
+            if pattern[0] == "*":
+                pattern = "\\" + pattern
+            pattern = re.sub("([()])", r"\\\1", pattern)
+            try:
+                match = re.compile(pattern).match
+            except re.error:
+                # Matching raises the error, as it always did
+                match = lambda string, pattern=pattern: re.match(pattern, string)
+            self.patternMatches.append((candidate, match))
+        self.literalSet = frozenset(self.literalMatches)
 
 
     def matchedBy(self, string):
@@ -134,38 +172,26 @@ class TranslatableString(object):
         string (or simply the original string, if no translation was found).
         """
 
-        def stringsMatch(inS, outS):
-            """
-            Compares a regular expression to a string
-
-            inS: the regular expression (or normal string)
-            outS: the normal string to be compared against
-            """
+        if string in self.literalSet:
+            return True
 
-            inString = str(inS)
-            outString = outS
-            if inString == outString:
+        for candidate, match in self.patternMatches:
+            if candidate == string or match(string) is not None:
                 return True
-            inString = inString + "$"
-            if inString[0] == "*":
-                inString = "\\" + inString
-
-            inString = re.sub("([()])", r"\\\1", inString)
-            match = re.match(inString, outString)
-            matched = match is not None
-
-            return matched
+        return False
 
-        matched = False
 
-        for translatedString in self.translatedStrings:
-            matched = stringsMatch(translatedString, string)
-            if not matched:
-                matched = translatedString == string
-            if matched:
-                return matched
+    def literalStrings(self):
+        """
+        The exact strings matchedBy accepts, or None if any of the translations
+        (or the original string) would be used as a regular expression that can
+        match other strings as well. A match against "$" also accepts a single
+        trailing newline, so each string comes with that variant too.
+        """
 
-        return stringsMatch(self.untranslatedString, string)
+        if self.patternMatches:
+            return None
+        return list(self.literalMatches)
 
 
     def __str__(self):
@@ -20,10 +20,16 @@ class SearchPath:
     This is somewhat analagous to an absolute path in a filesystem, except
     that some of searches may be recursive, rather than just searching
     direct children.
+
+    Alongside each search, the path may hold a hint: the child indexes
+    leading from the node the search starts at to the node it found when the
+    path was made. replay() follows the hints where they still lead to a
+    matching node, and only searches where they don't.
     """
 
     def __init__(self):
         self.lst = []
+        self.hints = []
 
 
     def __str__(self):
@@ -44,9 +50,10 @@ class SearchPath:
         return True
 
 
-    def append(self, predicate, isRecursive):
+    def append(self, predicate, isRecursive, hint=None):
         assert predicate
         self.lst.append((predicate, isRecursive))
+        self.hints.append(tuple(hint) if hint is not None else None)
 
 
     def __iter__(self):
@@ -91,6 +98,7 @@ class SearchPath:
         if i > 0:
             result = SearchPath()
             result.lst = other.lst[i + 1:]
+            result.hints = other.hints[i + 1:]
             return result
         return None
 
@@ -105,6 +113,7 @@ class SearchPath:
         result = SearchPath()
         for i in range(n):
             result.lst.append(self.lst[i])
+            result.hints.append(self.hints[i])
         return result
 
 
@@ -117,3 +126,60 @@ class SearchPath:
 
         (predicate, _) = self.lst[i]
         return predicate
+
+
+    def getHint(self, i):
+        """
+        Get the child index hint of the i-th search, or None.
+        """
+
+        debug_log("getHint(self, i=%s)" % str(i))
+
+        return self.hints[i]
+
+
+    def replay(self, start=None):
+        """
+        Find the node this path leads to, starting at the given node (the
+        desktop by default) and applying each search in turn. Where a search
+        has a hint, the child indexes are followed first and the node they lead
+        to is used if it satisfies the predicate; otherwise (or without a hint)
+        the search is made as Node.findChild would, retrying and raising
+        SearchError if the node can't be found.
+        """
+
+        debug_log("replay(self, start=%s)" % str(start))
+
+        from dogtail import tree
+
+        node = start if start is not None else tree.root
+        for (predicate, isRecursive), hint in zip(self.lst, self.hints):
+            hinted = self.__followHint(node, hint, isRecursive)
+            if hinted is not None and tree.satisfiesQuietly(predicate.satisfiedByNode, hinted):
+                node = hinted
+                continue
+
+            debug_log("Hint %s for %s no longer applies, searching" % (str(hint), predicate.describeSearchResult()))
+            node = node.findChild(predicate, recursive=isRecursive, showingOnly=False)
+        return node
+
+
+    def __followHint(self, node, hint, isRecursive):
+        """
+        The node the child indexes lead to from the given one, or None.
+        """
+
+        if not hint or (not isRecursive and len(hint) != 1):
+            return None
+
+        try:
+            for index in hint:
+                if not 0 <= index < node.childCount:
+                    return None
+                node = node[index]
+                if node is None:
+                    return None
+        except Exception as error:
+            debug_log("Hint could not be followed: %s" % str(error))
+            return None
+        return node
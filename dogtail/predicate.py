@@ -22,6 +22,18 @@ def stringMatches(scriptName, reportedName):
     return scriptName.matchedBy(reportedName)
 
 
+def prunesSubtrees(pred):
+    """
+    Does the predicate declare any subtrees a search for it can skip? Combined
+    predicates (And, Or) tell by their pruning attribute.
+    """
+
+    pruning = getattr(pred, "pruning", None)
+    if pruning is not None:
+        return pruning
+    return type(pred).prunes is not Predicate.prunes
+
+
 def makeScriptRecursiveArgument(isRecursive, defaultValue):
     if isRecursive == defaultValue:
         return ""
@@ -53,12 +65,62 @@ def makeCamel(string):
     return result
 
 
+"""
+Rough cost of reading a node property while evaluating a predicate, in calls to
+the application. The role is read once and cached on the node, so role name
+checks are nearly free; relations (labeller) take several calls. Checks are
+made cheapest first, so that most nodes are rejected by a cheap one.
+"""
+propertyCosts = {
+    "roleName": 0.1,
+    "name": 1,
+    "description": 1,
+    "childCount": 1,
+    "states": 1,
+    "attributes": 1,
+    "accessibleId": 1,
+    "text": 2,
+    "labeller": 3,
+}
+unknownCost = 5
+
+
+def propertiesCost(properties):
+    """
+    Estimated cost of reading the given properties, see propertyCosts.
+    """
+
+    if properties is None:
+        return unknownCost
+    return sum(propertyCosts.get(name, 1) for name in properties)
+
+
 class Predicate(object):
     """
     Abstract base class representing a predicate function on nodes.
     It's more than just a function in that it has data and can describe itself
+
+    Predicates that only match nodes of certain roles list their role names in
+    roleNames, which lets the search ask the application for just those nodes
+    (through the AT-SPI Collection interface) before checking the rest of the
+    predicate. None means a node of any role may satisfy the predicate.
+
+    Predicates can also tell the search not to look below some nodes by
+    overriding prunes(), and can declare the exact names (literalNames()),
+    accessible id (literalIdentifier()) or label texts (literalLabels()) a
+    match must have, which lets a search look them up in an application or
+    label index instead of walking the tree.
+
+    requiredProperties lists the node properties satisfiedByNode reads, so
+    that a search can fetch them all at once (see Node.prefetch). None means
+    the predicate may read anything.
+
+    Predicates combine with & (And), | (Or) and ~ (Not).
     """
 
+    roleNames = None
+    requiredProperties = None
+
     def satisfiedByNode(self, node):
         """
         Pure virtual method returning a boolean if the predicate is satisfied by the node.
@@ -66,6 +128,57 @@ class Predicate(object):
         raise NotImplementedError
 
 
+    def prunes(self, node):
+        """
+        Whether a search for this predicate should skip everything below the
+        node (the node itself is still checked). Nothing is pruned by default.
+        """
+        return False
+
+
+    def literalNames(self):
+        """
+        List of the exact names a node satisfying the predicate must have one
+        of, or None if the name is not restricted to a fixed set of strings.
+        """
+        return None
+
+
+    def literalIdentifier(self):
+        """
+        The accessible id a node satisfying the predicate must have, or None.
+        """
+        return None
+
+
+    def literalLabels(self):
+        """
+        List of the exact texts a label of a node satisfying the predicate must
+        have one of, or None.
+        """
+        return None
+
+
+    def cost(self):
+        """
+        Estimated cost of satisfiedByNode on a node, see propertyCosts. Combined
+        predicates check their cheapest parts first.
+        """
+        return propertiesCost(self.requiredProperties)
+
+
+    def __and__(self, other):
+        return And(self, other)
+
+
+    def __or__(self, other):
+        return Or(self, other)
+
+
+    def __invert__(self):
+        return Not(self)
+
+
     def describeSearchResult(self, node):
         """
         Pure virtual method returning a string that describes the search result.
@@ -109,6 +222,9 @@ class IsAnApplicationNamed(Predicate):
     Search subclass that looks for an application by name
     """
 
+    roleNames = ("application",)
+    requiredProperties = ("roleName", "name")
+
     def __init__(self, appName):
         self.appName = TranslatableString(appName)
         self.debugName = self.describeSearchResult()
@@ -133,6 +249,11 @@ class IsAnApplicationNamed(Predicate):
         return satisfiedByNode
 
 
+    def prunes(self, node):
+        # Applications don't contain other applications.
+        return node.roleName == "application"
+
+
     def describeSearchResult(self):
         debug_log("describeSearchResult(self)")
         return "%s application" % self.appName
@@ -161,6 +282,19 @@ class GenericPredicate(Predicate):
 
         self.roleName = roleName
         self.description = description
+        # A label search ignores the other fields, see satisfiedByNode
+        self.roleNames = (roleName,) if roleName and not label else None
+        self.requiredProperties = None
+        if not label:
+            self.requiredProperties = ()
+            if name:
+                self.requiredProperties += ("name",)
+            if roleName:
+                self.requiredProperties += ("roleName",)
+            if description:
+                self.requiredProperties += ("description",)
+            if identifier:
+                self.requiredProperties += ("attributes", "accessibleId")
 
         if label:
             self.label = TranslatableString(label)
@@ -190,6 +324,24 @@ class GenericPredicate(Predicate):
 
 
     def _genCompareFunc(self):
+        def identifierMatches(node):
+            return ('id' in node.get_attributes() and
+                    self.identifier == node.get_attributes()['id']) or \
+                   ('accessibleId' in dir(node) and
+                    self.identifier == node.accessibleId)
+
+        # Check the fields that were set, cheapest first
+        checks = []
+        if self.name:
+            checks.append((propertyCosts["name"], lambda node: stringMatches(self.name, node.name)))
+        if self.roleName:
+            checks.append((propertyCosts["roleName"], lambda node: self.roleName == node.roleName))
+        if self.description:
+            checks.append((propertyCosts["description"], lambda node: self.description == node.description))
+        if self.identifier:
+            checks.append((propertyCosts["attributes"] + propertyCosts["accessibleId"], identifierMatches))
+        checks = [check for (_, check) in sorted(checks, key=lambda entry: entry[0])]
+
         def satisfiedByNode(node):
             if self.label:
                 if node.labeller:
@@ -199,20 +351,8 @@ class GenericPredicate(Predicate):
             else:
                 # Ensure the node matches any criteria that were set:
                 try:
-                    if self.name:
-                        if not stringMatches(self.name, node.name):
-                            return False
-                    if self.roleName:
-                        if self.roleName != node.roleName:
-                            return False
-                    if self.description:
-                        if self.description != node.description:
-                            return False
-                    if self.identifier:
-                        if ('id' not in node.get_attributes() or \
-                            self.identifier != node.get_attributes()['id']) and \
-                           ('accessibleId' not in dir(node) or \
-                            self.identifier != node.accessibleId):
+                    for check in checks:
+                        if not check(node):
                             return False
                 except GLib.GError as e:
                     if re.match(r"name :[0-9]+\.[0-9]+ was not provided", e.message):
@@ -224,6 +364,31 @@ class GenericPredicate(Predicate):
         return satisfiedByNode
 
 
+    def literalNames(self):
+        # A label search ignores the other fields, see satisfiedByNode
+        if self.label or not self.name:
+            return None
+        return self.name.literalStrings()
+
+
+    def literalIdentifier(self):
+        if self.label or not self.identifier:
+            return None
+        return self.identifier
+
+
+    def literalLabels(self):
+        if not self.label:
+            return None
+        return self.label.literalStrings()
+
+
+    def cost(self):
+        if self.label:
+            return propertyCosts["labeller"] + propertyCosts["name"]
+        return propertiesCost(self.requiredProperties)
+
+
     def describeSearchResult(self):
         debug_log("describeSearchResult(self)")
         return self.debugName
@@ -271,6 +436,8 @@ class IsNamed(Predicate):
     Predicate subclass that looks simply by name
     """
 
+    requiredProperties = ("name",)
+
     def __init__(self, name):
         self.name = TranslatableString(name)
         self.debugName = self.describeSearchResult()
@@ -283,6 +450,10 @@ class IsNamed(Predicate):
         return satisfiedByNode
 
 
+    def literalNames(self):
+        return self.name.literalStrings()
+
+
     def describeSearchResult(self):
         debug_log("describeSearchResult(self)")
         return "named %s" % self.name
@@ -303,6 +474,9 @@ class IsAWindowNamed(Predicate):
     Predicate subclass that looks for a top-level window by name
     """
 
+    roleNames = ("frame",)
+    requiredProperties = ("roleName", "name")
+
     def __init__(self, windowName):
         self.windowName = TranslatableString(windowName)
         self.debugName = self.describeSearchResult()
@@ -314,6 +488,11 @@ class IsAWindowNamed(Predicate):
             return node.roleName == "frame" and stringMatches(self.windowName, node.name)
         return satisfiedByNode
 
+
+    def literalNames(self):
+        return self.windowName.literalStrings()
+
+
     def describeSearchResult(self):
         debug_log("describeSearchResult(self)")
         return "%s window" % self.windowName
@@ -334,6 +513,9 @@ class IsAWindow(Predicate):
     Predicate subclass that looks for top-level windows
     """
 
+    roleNames = ("frame",)
+    requiredProperties = ("roleName",)
+
     def __init__(self):
         self.satisfiedByNode = lambda node: node.roleName == "frame"
 
@@ -348,6 +530,9 @@ class IsADialogNamed(Predicate):
     Predicate subclass that looks for a top-level dialog by name
     """
 
+    roleNames = ("dialog",)
+    requiredProperties = ("roleName", "name")
+
     def __init__(self, dialogName):
         self.dialogName = TranslatableString(dialogName)
         self.debugName = self.describeSearchResult()
@@ -360,6 +545,10 @@ class IsADialogNamed(Predicate):
         return satisfiedByNode
 
 
+    def literalNames(self):
+        return self.dialogName.literalStrings()
+
+
     def describeSearchResult(self):
         debug_log("describeSearchResult(self)")
         return "%s dialog" % self.dialogName
@@ -400,6 +589,14 @@ class IsLabelledAs(Predicate):
         return satisfiedByNode
 
 
+    def literalLabels(self):
+        return self.labelText.literalStrings()
+
+
+    def cost(self):
+        return propertyCosts["labeller"] + propertyCosts["name"]
+
+
     def describeSearchResult(self):
         debug_log("describeSearchResult(self)")
         return "labelled %s" % self.labelText
@@ -420,12 +617,19 @@ class IsAMenuNamed(Predicate):
     Predicate subclass that looks for a menu by name
     """
 
+    roleNames = ("menu",)
+    requiredProperties = ("roleName", "name")
+
     def __init__(self, menuName):
         self.menuName = TranslatableString(menuName)
         self.debugName = self.describeSearchResult()
         self.satisfiedByNode = lambda node: node.roleName == "menu" and stringMatches(self.menuName, node.name)
 
 
+    def literalNames(self):
+        return self.menuName.literalStrings()
+
+
     def describeSearchResult(self):
         debug_log("describeSearchResult(self)")
         return "%s menu" % (self.menuName)
@@ -446,6 +650,9 @@ class IsAMenuItemNamed(Predicate):
     Predicate subclass that looks for a menu item by name
     """
 
+    roleNames = ("menu item", "check menu item", "radio menu item", "tearoff menu item")
+    requiredProperties = ("roleName", "name")
+
     def __init__(self, menuItemName):
         self.menuItemName = TranslatableString(menuItemName)
         self.debugName = self.describeSearchResult()
@@ -453,6 +660,10 @@ class IsAMenuItemNamed(Predicate):
             node.roleName.endswith("menu item") and stringMatches(self.menuItemName, node.name)
 
 
+    def literalNames(self):
+        return self.menuItemName.literalStrings()
+
+
     def describeSearchResult(self):
         debug_log("describeSearchResult(self)")
         return "%s menuitem" % (self.menuItemName)
@@ -473,12 +684,19 @@ class IsATextEntryNamed(Predicate):
     Predicate subclass that looks for a text entry by name
     """
 
+    roleNames = ("text",)
+    requiredProperties = ("roleName", "name")
+
     def __init__(self, textEntryName):
         self.textEntryName = TranslatableString(textEntryName)
         self.debugName = self.describeSearchResult()
         self.satisfiedByNode = lambda node: node.roleName == "text" and stringMatches(self.textEntryName, node.name)
 
 
+    def literalNames(self):
+        return self.textEntryName.literalStrings()
+
+
     def describeSearchResult(self):
         debug_log("describeSearchResult(self)")
         return "%s textentry" % (self.textEntryName)
@@ -499,12 +717,19 @@ class IsAButtonNamed(Predicate):
     Predicate subclass that looks for a button by name
     """
 
+    roleNames = ("button", "push button")
+    requiredProperties = ("roleName", "name")
+
     def __init__(self, buttonName):
         self.buttonName = TranslatableString(buttonName)
         self.debugName = self.describeSearchResult()
         self.satisfiedByNode = lambda node: node.roleName in ("button", "push button") and stringMatches(self.buttonName, node.name)
 
 
+    def literalNames(self):
+        return self.buttonName.literalStrings()
+
+
     def describeSearchResult(self):
         debug_log("describeSearchResult(self)")
         return "%s button" % (self.buttonName)
@@ -525,12 +750,19 @@ class IsATabNamed(Predicate):
     Predicate subclass that looks for a tab by name
     """
 
+    roleNames = ("page tab",)
+    requiredProperties = ("roleName", "name")
+
     def __init__(self, tabName):
         self.tabName = TranslatableString(tabName)
         self.debugName = self.describeSearchResult()
         self.satisfiedByNode = lambda node: node.roleName == "page tab" and stringMatches(self.tabName, node.name)
 
 
+    def literalNames(self):
+        return self.tabName.literalStrings()
+
+
     def describeSearchResult(self):
         debug_log("describeSearchResult(self)")
         return "%s tab" % (self.tabName)
@@ -544,3 +776,185 @@ class IsATabNamed(Predicate):
     def makeScriptVariableName(self):
         debug_log("makeScriptVariableName(self)")
         return makeCamel(self.tabName) + "Tab"
+
+
+class And(Predicate):
+    """
+    Predicate satisfied by nodes satisfying all of the given predicates, which
+    are checked cheapest first (see Predicate.cost).
+    """
+
+    def __init__(self, *predicates):
+        assert predicates
+        self.predicates = tuple(sorted(predicates, key=lambda pred: pred.cost()))
+        self.debugName = self.describeSearchResult()
+
+        # A match has one of the role names every restricted part allows
+        restricted = [pred.roleNames for pred in self.predicates if pred.roleNames is not None]
+        self.roleNames = None
+        if restricted:
+            self.roleNames = tuple(roleName for roleName in restricted[0]
+                                   if all(roleName in roleNames for roleNames in restricted[1:]))
+
+        required = [pred.requiredProperties for pred in self.predicates]
+        self.requiredProperties = None
+        if None not in required:
+            self.requiredProperties = tuple(sorted(set(name for names in required for name in names)))
+
+        # Nothing below a node can satisfy all parts if it can't satisfy one of them
+        self.pruning = any(prunesSubtrees(pred) for pred in self.predicates)
+        self.satisfiedByNode = self._genCompareFunc()
+
+
+    def _genCompareFunc(self):
+        functions = [pred.satisfiedByNode for pred in self.predicates]
+
+        def satisfiedByNode(node):
+            for function in functions:
+                if not function(node):
+                    return False
+            return True
+        return satisfiedByNode
+
+
+    def prunes(self, node):
+        return any(pred.prunes(node) for pred in self.predicates)
+
+
+    def literalNames(self):
+        for pred in self.predicates:
+            names = pred.literalNames()
+            if names is not None:
+                return names
+        return None
+
+
+    def literalIdentifier(self):
+        for pred in self.predicates:
+            identifier = pred.literalIdentifier()
+            if identifier is not None:
+                return identifier
+        return None
+
+
+    def literalLabels(self):
+        for pred in self.predicates:
+            labels = pred.literalLabels()
+            if labels is not None:
+                return labels
+        return None
+
+
+    def cost(self):
+        return sum(pred.cost() for pred in self.predicates)
+
+
+    def describeSearchResult(self):
+        debug_log("describeSearchResult(self)")
+        return "(%s)" % " and ".join(str(pred.describeSearchResult()) for pred in self.predicates)
+
+
+    def makeScriptVariableName(self):
+        debug_log("makeScriptVariableName(self)")
+        return makeCamel(self.predicates[0].describeSearchResult()) + "Node"
+
+
+class Or(Predicate):
+    """
+    Predicate satisfied by nodes satisfying any of the given predicates, which
+    are checked cheapest first (see Predicate.cost).
+    """
+
+    def __init__(self, *predicates):
+        assert predicates
+        self.predicates = tuple(sorted(predicates, key=lambda pred: pred.cost()))
+        self.debugName = self.describeSearchResult()
+
+        roleNames = [pred.roleNames for pred in self.predicates]
+        self.roleNames = None
+        if None not in roleNames:
+            self.roleNames = tuple(sorted(set(roleName for names in roleNames for roleName in names)))
+
+        required = [pred.requiredProperties for pred in self.predicates]
+        self.requiredProperties = None
+        if None not in required:
+            self.requiredProperties = tuple(sorted(set(name for names in required for name in names)))
+
+        # Only what none of the parts can be found below may be skipped
+        self.pruning = all(prunesSubtrees(pred) for pred in self.predicates)
+        self.satisfiedByNode = self._genCompareFunc()
+
+
+    def _genCompareFunc(self):
+        functions = [pred.satisfiedByNode for pred in self.predicates]
+
+        def satisfiedByNode(node):
+            for function in functions:
+                if function(node):
+                    return True
+            return False
+        return satisfiedByNode
+
+
+    def prunes(self, node):
+        return all(pred.prunes(node) for pred in self.predicates)
+
+
+    def literalNames(self):
+        names = []
+        for pred in self.predicates:
+            predNames = pred.literalNames()
+            if predNames is None:
+                return None
+            names.extend(predNames)
+        return names
+
+
+    def literalLabels(self):
+        labels = []
+        for pred in self.predicates:
+            predLabels = pred.literalLabels()
+            if predLabels is None:
+                return None
+            labels.extend(predLabels)
+        return labels
+
+
+    def cost(self):
+        return sum(pred.cost() for pred in self.predicates)
+
+
+    def describeSearchResult(self):
+        debug_log("describeSearchResult(self)")
+        return "(%s)" % " or ".join(str(pred.describeSearchResult()) for pred in self.predicates)
+
+
+    def makeScriptVariableName(self):
+        debug_log("makeScriptVariableName(self)")
+        return makeCamel(self.predicates[0].describeSearchResult()) + "Node"
+
+
+class Not(Predicate):
+    """
+    Predicate satisfied by nodes not satisfying the given predicate.
+    """
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+        self.requiredProperties = predicate.requiredProperties
+        self.debugName = self.describeSearchResult()
+        self.satisfiedByNode = lambda node: not predicate.satisfiedByNode(node)
+
+
+    def cost(self):
+        return self.predicate.cost()
+
+
+    def describeSearchResult(self):
+        debug_log("describeSearchResult(self)")
+        return "not %s" % self.predicate.describeSearchResult()
+
+
+    def makeScriptVariableName(self):
+        debug_log("makeScriptVariableName(self)")
+        return "not" + makeCamel(self.predicate.describeSearchResult()).capitalize() + "Node"
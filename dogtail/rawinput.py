@@ -1,12 +1,13 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
 from dogtail.config import config
-from dogtail.utils import doDelay
+from dogtail.utils import doDelay, doSyncDelay
 from dogtail.logging import debug_log
 from dogtail.logging import debugLogger as logger
 from pyatspi import Registry as registry
 from pyatspi import (KEY_SYM, KEY_PRESS, KEY_PRESSRELEASE, KEY_RELEASE)
-from time import sleep
+from time import sleep, time
+from functools import lru_cache
 import os
 
 import gi
@@ -152,9 +153,11 @@ def checkCoordinates(x, y):
         raise ValueError("Attempting to generate a mouse event at negative coordinates: (%s,%s)" % (x, y))
 
 
-def click(x, y, button=1, check=True, window_id=None):
+def click(x, y, button=1, check=True, window_id=None, busName=None):
     """
-    Synthesize a mouse button click at (x,y)
+    Synthesize a mouse button click at (x,y). With config.syncMode "events",
+    wait for the application with the given bus name (or, if None, the whole
+    desktop) to go idle afterwards.
     """
 
     (x, y) = update_coords((x, y))
@@ -171,12 +174,12 @@ def click(x, y, button=1, check=True, window_id=None):
         ponytail_check_connection(window_id)
         ponytail.generateButtonEvent(button, x, y)
 
-    doDelay(config.actionDelay)
+    doSyncDelay(config.actionDelay, busName=busName)
 
 
-def point(x, y, check=True, window_id=None):
+def point(x, y, check=True, window_id=None, busName=None):
     """
-    Synthesize a button point at (x,y)
+    Synthesize a button point at (x,y), then wait like click() does.
     """
 
     (x, y) = update_coords((x, y))
@@ -193,12 +196,13 @@ def point(x, y, check=True, window_id=None):
         ponytail_check_connection(window_id)
         ponytail.generateMotionEvent(x, y)
 
-    doDelay(config.actionDelay)
+    doSyncDelay(config.actionDelay, busName=busName)
 
 
-def doubleClick(x, y, button=1, check=True, window_id=None):
+def doubleClick(x, y, button=1, check=True, window_id=None, busName=None):
     """
-    Synthesize a mouse button double-click at (x,y)
+    Synthesize a mouse button double-click at (x,y), then wait like click()
+    does.
     """
 
     (x, y) = update_coords((x, y))
@@ -224,7 +228,7 @@ def doubleClick(x, y, button=1, check=True, window_id=None):
             ponytail.connectMonitor()
             ponytail.generateButtonRelease(button)
 
-    doDelay(config.actionDelay)
+    doSyncDelay(config.actionDelay, busName=busName)
 
 
 def press(x, y, button=1, check=True, window_id=None, delay=config.defaultDelay):
@@ -299,10 +303,55 @@ def absoluteMotion(x, y, mouseDelay=None, check=True, window_id=None):
         doDelay()
 
 
-def absoluteMotionWithTrajectory(source_x, source_y, dest_x, dest_y, mouseDelay=None, check=True, window_id=None):
+easings = {
+    "linear": lambda t: t,
+    "easeIn": lambda t: t * t,
+    "easeOut": lambda t: t * (2 - t),
+    "easeInOut": lambda t: t * t * (3 - 2 * t),
+}
+
+
+def trajectoryPoints(source_x, source_y, dest_x, dest_y, steps, easing="linear"):
+    """
+    Points of a trajectory from source to destination (which is not included)
+    sampled at the given number of steps, spaced by the easing curve (one of
+    the names in rawinput.easings or a function mapping 0..1 onto 0..1).
+    The last point is the destination. Points that would repeat the previous
+    one are left out.
+    """
+
+    if callable(easing):
+        ease = easing
+    elif easing in easings:
+        ease = easings[easing]
+    else:
+        raise ValueError("Unknown easing '%s', expected one of: %s" % (str(easing), ", ".join(sorted(easings))))
+    points = []
+    previous = (int(source_x), int(source_y))
+    for step in range(1, steps + 1):
+        progress = ease(float(step) / steps)
+        point = (int(round(source_x + (dest_x - source_x) * progress)),
+                 int(round(source_y + (dest_y - source_y) * progress)))
+        if point != previous:
+            points.append(point)
+            previous = point
+    return points
+
+
+def absoluteMotionWithTrajectory(source_x, source_y, dest_x, dest_y, mouseDelay=None, check=True, window_id=None,
+                                 duration=None, hz=None, easing=None):
     """
     Synthetize mouse absolute motion with trajectory. The 'trajectory' means that the whole motion
     is divided into several atomic movements which are synthetized separately.
+
+    The motion takes duration seconds (config.trajectoryDuration by default), with a motion event
+    hz times a second (config.trajectoryRate), but at least config.trajectoryMinSteps of them so
+    that the toolkit sees the pointer moving, and at most one per pixel. The events are spaced by
+    the easing curve (config.trajectoryEasing, see rawinput.easings).
+
+    If a mouseDelay is given and no duration, the motion moves one pixel at a time instead,
+    sleeping for mouseDelay after each. Either way, it sleeps for mouseDelay (or the default
+    delay) once the pointer has arrived. Unknown easing names raise ValueError.
     """
 
     if check:
@@ -321,22 +370,34 @@ def absoluteMotionWithTrajectory(source_x, source_y, dest_x, dest_y, mouseDelay=
     if max_len == 0:
         return
 
-    dx /= max_len
-    dy /= max_len
-    act_x = float(source_x)
-    act_y = float(source_y)
-
-    for _ in range(0, int(max_len)):
-        act_x += dx
-        act_y += dy
-        if mouseDelay:
-            doDelay(mouseDelay)
+    if mouseDelay and duration is None:
+        points = trajectoryPoints(source_x, source_y, dest_x, dest_y, max(1, int(max_len)))
+        interval = mouseDelay
+    else:
+        if duration is None:
+            duration = config.trajectoryDuration
+        if hz is None:
+            hz = config.trajectoryRate
+        steps = max(config.trajectoryMinSteps, int(duration * hz))
+        points = trajectoryPoints(source_x, source_y, dest_x, dest_y, max(1, min(steps, int(max_len))),
+                                  easing or config.trajectoryEasing)
+        if not points:
+            # Less than a pixel to go, which rounds back onto the source.
+            return
+        interval = float(duration) / len(points)
+
+    start = time()
+    for i, (act_x, act_y) in enumerate(points):
+        # Keep to the clock, so that slow event generation doesn't stretch the motion.
+        remaining = start + (i + 1) * interval - time()
+        if remaining > 0:
+            sleep(remaining)
 
         if SESSION_TYPE == "x11":
-            registry.generateMouseEvent(int(act_x), int(act_y), name="abs")
+            registry.generateMouseEvent(act_x, act_y, name="abs")
 
         else:
-            ponytail.generateMotionEvent(int(act_x), int(act_y))
+            ponytail.generateMotionEvent(act_x, act_y)
 
     if mouseDelay:
         doDelay(mouseDelay)
@@ -382,27 +443,31 @@ def drag(fromXY, toXY, button=1, check=True):
     doDelay()
 
 
-def dragNodeToNode(source_node, dest_node, button=1, check=True):
+def dragNodeToNode(source_node, dest_node, button=1, check=True, duration=None, hz=None, easing=None):
     """
     Drag source_node onto dest_node. These are tree.Node objects. Takes positions
     of these Nodes directly, so you don't have to calculate end enter them directly.
+    The pointer moves between them along a trajectory timed by duration, hz and
+    easing, see absoluteMotionWithTrajectory.
     """
 
     logger.log("Drag node to node source_node=%s, dest_node=%s, button=%s, check=%s" %
                   (str(source_node), str(dest_node), str(button), str(check)))
 
-    x = source_node.position[0] + source_node.size[0] / 2
-    y = source_node.position[1] + source_node.size[1] / 2
-    press(x, y, button, check, source_node.window_id)
+    source_x = source_node.position[0] + source_node.size[0] / 2
+    source_y = source_node.position[1] + source_node.size[1] / 2
+    press(source_x, source_y, button, check, source_node.window_id)
 
     x = dest_node.position[0] + dest_node.size[0] / 2
     y = dest_node.position[1] + dest_node.size[1] / 2
+    absoluteMotionWithTrajectory(source_x, source_y, x, y, check=check, window_id=source_node.window_id,
+                                 duration=duration, hz=hz, easing=easing)
 
     release(x, y, button, check, window_id=dest_node.window_id)
     doDelay()
 
 
-def dragWithTrajectoryGlobal(fromXY, toXY, button=1):
+def dragWithTrajectoryGlobal(fromXY, toXY, button=1, duration=None, hz=None, easing=None):
     """
     Synthetize a mouse press, drag (including move events), and release on the screen
     For use on Wayland - as this function forces using global coords, although we get
@@ -413,6 +478,7 @@ def dragWithTrajectoryGlobal(fromXY, toXY, button=1):
 
     Having 'trajectory' appears to be necessary on Wayland for any drags. Use 'dragWithTrajectory'
     or just 'drag' on X sessions like in pre-wayland version of dogtail.
+    The motion is timed by duration, hz and easing, see absoluteMotionWithTrajectory.
     """
 
     logger.log("Drag with trajectory global fromXY=%s, toXY=%s, button=%s" %
@@ -428,7 +494,8 @@ def dragWithTrajectoryGlobal(fromXY, toXY, button=1):
         doDelay(config.defaultDelay)
 
         (x, y) = toXY
-        absoluteMotionWithTrajectory(fromXY[0], fromXY[1], x, y, mouseDelay=0.01, window_id="")
+        absoluteMotionWithTrajectory(fromXY[0], fromXY[1], x, y, window_id="",
+                                     duration=duration, hz=hz, easing=easing)
 
         ponytail.generateMotionEvent(x, y)
         doDelay(config.defaultDelay)
@@ -436,14 +503,17 @@ def dragWithTrajectoryGlobal(fromXY, toXY, button=1):
         doDelay()
 
     else:
-        dragWithTrajectory(fromXY, toXY, button)
+        dragWithTrajectory(fromXY, toXY, button, duration=duration, hz=hz, easing=easing)
 
 
-def dragWithTrajectory(fromXY, toXY, button=1, check=True, press_delay=config.defaultDelay, mouse_delay=0.01):
+def dragWithTrajectory(fromXY, toXY, button=1, check=True, press_delay=config.defaultDelay, mouse_delay=None,
+                       duration=None, hz=None, easing=None):
     """
     Synthetize a mouse press, drag (including move events), and release on the screen
     Please note, that on Wayland, this function works for drags only within a single window.
     On X this function works with global coords and equals dragWithTrajectoryGlobal
+    The motion is timed by duration, hz and easing, or moves a pixel per mouse_delay,
+    see absoluteMotionWithTrajectory.
     """
 
     logger.log("Drag with trajectory fromXY=%s, toXY=%s, button=%s, check=%s, press_delay=%s, mouse_delay=%s" %
@@ -453,25 +523,27 @@ def dragWithTrajectory(fromXY, toXY, button=1, check=True, press_delay=config.de
     press(x, y, button, check, delay=press_delay)
 
     (x, y) = toXY
-    absoluteMotionWithTrajectory(fromXY[0], fromXY[1], x, y, mouseDelay=mouse_delay, check=check)
+    absoluteMotionWithTrajectory(fromXY[0], fromXY[1], x, y, mouseDelay=mouse_delay, check=check,
+                                 duration=duration, hz=hz, easing=easing)
     doDelay()
 
     release(x, y, button, check)
     doDelay()
 
 
-def typeText(string):
+def typeText(string, delay=None):
     """
     Types the specified string, one character at a time.
     Please note, you may have to set a higher typing delay,
     if your machine misses/switches the characters typed.
     Needed sometimes on slow setups/VMs typing non-ASCII utf8 chars.
+    The delay after each character defaults to config.typingDelay.
     """
 
-    debug_log("typeText(string=%s)" % string)
+    debug_log("typeText(string=%s, delay=%s)" % (string, str(delay)))
 
     for char in string:
-        pressKey(char)
+        pressKey(char, delay=delay)
 
 
 keyNameAliases = {
@@ -510,6 +582,36 @@ def uniCharToKeySym(uniChar):
     return keySym
 
 
+keymap = None
+keySyms = {}
+keyCodes = {}
+
+
+def getKeymap():
+    """
+    The keymap of the default display. Keycodes looked up through it are kept
+    in keyCodes (and parsed key combos by parseKeyCombo) until the keymap
+    changes, which is noticed while events are dispatched (see
+    dogtail.utils.pumpEvents).
+    """
+
+    global keymap
+    current = Gdk.Keymap.get_for_display(Gdk.Display.get_default())
+    if current is not keymap:
+        if keymap is not None:
+            clearKeymapCache()
+        keymap = current
+        keymap.connect("keys-changed", clearKeymapCache)
+    return keymap
+
+
+def clearKeymapCache(*args):
+    debug_log("clearKeymapCache()")
+
+    keyCodes.clear()
+    parseKeyCombo.cache_clear()
+
+
 def keyNameToKeySym(keyName):
     """
     Use GDK to get the key symbol for a key name.
@@ -517,7 +619,22 @@ def keyNameToKeySym(keyName):
 
     debug_log("keyNameToKeySym(keyName=%s)" % keyName)
 
-    keyName = keyNameAliases.get(keyName.lower(), keyName)
+    try:
+        return keySyms[keyName]
+    except KeyError:
+        pass
+
+    keySym = lookUpKeySym(keyNameAliases.get(keyName.lower(), keyName))
+    keySyms[keyName] = keySym
+    return keySym
+
+
+def lookUpKeySym(keyName):
+    """
+    Use GDK to get the key symbol for an unaliased key name, trying it as a
+    key name, as a character and as a Gdk.KEY_ constant in turn.
+    """
+
     keySym = Gdk.keyval_from_name(keyName)
     # various error 'codes' returned for non-recognized chars in versions of GTK3.X
     if keySym == 0xffffff or keySym == 0x0 or keySym is None:
@@ -544,24 +661,34 @@ def keyNameToKeyCode(keyName):
 
     debug_log("keyNameToKeyCode(keyName=%s)" % keyName)
 
-    keymap = Gdk.Keymap.get_for_display(Gdk.Display.get_default())
-    entries = keymap.get_entries_for_keyval(Gdk.keyval_from_name(keyName))
+    try:
+        return keyCodes[keyName]
+    except KeyError:
+        pass
+
+    entries = getKeymap().get_entries_for_keyval(Gdk.keyval_from_name(keyName))
 
     try:
-        return entries[1][0].keycode
+        keyCode = entries[1][0].keycode
     except TypeError:
-        pass
+        keyCode = None
+    keyCodes[keyName] = keyCode
+    return keyCode
 
 
-def pressKey(keyName, window_id=None):
+def pressKey(keyName, window_id=None, delay=None):
     """
     Presses (and releases) the key specified by keyName.
     keyName is the English name of the key as seen on the keyboard. Ex: 'enter'
     Names are looked up in Gdk.KEY_ If they are not found there, they are
     looked up by uniCharToKeySym().
+    The delay after the key defaults to config.typingDelay.
     """
 
-    debug_log("pressKey(keyName=%s, window_id=%s)" % (keyName, str(window_id)))
+    debug_log("pressKey(keyName=%s, window_id=%s, delay=%s)" % (keyName, str(window_id), str(delay)))
+
+    if delay is None:
+        delay = config.typingDelay
 
     if keyName.lower() in ("esc", "escape", "enter", "return"):
         window_id = "" # when this would quit a window, release event would be doomed
@@ -569,11 +696,11 @@ def pressKey(keyName, window_id=None):
     keySym = keyNameToKeySym(keyName)
     if SESSION_TYPE == "x11":
         registry.generateKeyboardEvent(keySym, None, KEY_SYM)
-        doTypingDelay()
+        doDelay(delay)
 
     else:
         ponytail_check_connection(window_id, input_source="keyboard")
-        ponytail.generateKeysymEvent(keySym, delay=config.typingDelay/2)
+        ponytail.generateKeysymEvent(keySym, delay=delay/2)
 
 
 
@@ -588,32 +715,15 @@ def keyCombo(comboString):
 
     debug_log("keyCombo(comboString=%s)" % comboString)
 
-    strings = []
-    for s in comboString.split('<'):
-        if s:
-            for S in s.split('>'):
-                if S:
-                    S = keyNameAliases.get(S.lower(), S)
-                    strings.append(S)
-
-    for s in strings:
-        if not hasattr(Gdk, s):
-            if not hasattr(Gdk, "KEY_" + s):
-                raise ValueError("Cannot find key '%s'" % s)
-
-    modifiers = strings[:-1]
-    finalKey = strings[-1]
+    modifiers, finalCode = parseKeyCombo(comboString)
 
     if SESSION_TYPE == "x11":
-        for modifier in modifiers:
-            code = keyNameToKeyCode(modifier)
+        for code in modifiers:
             registry.generateKeyboardEvent(code, None, KEY_PRESS)
 
-        code = keyNameToKeyCode(finalKey)
-        registry.generateKeyboardEvent(code, None, KEY_PRESSRELEASE)
+        registry.generateKeyboardEvent(finalCode, None, KEY_PRESSRELEASE)
 
-        for modifier in modifiers:
-            code = keyNameToKeyCode(modifier)
+        for code in modifiers:
             registry.generateKeyboardEvent(code, None, KEY_RELEASE)
 
     else:
@@ -621,18 +731,42 @@ def keyCombo(comboString):
         # before final release i.e. with alt-f4 ctrl-q etc!
         ponytail_check_connection(input_source="keyboard", window_id="")
 
-        for modifier in modifiers:
-            code = keyNameToKeyCode(modifier)
+        for code in modifiers:
             ponytail.generateKeycodePress(code)
 
-        code = keyNameToKeyCode(finalKey)
-        ponytail.generateKeycodeEvent(code)
+        ponytail.generateKeycodeEvent(finalCode)
 
-        for modifier in modifiers:
-            code = keyNameToKeyCode(modifier)
+        for code in modifiers:
             ponytail.generateKeycodeRelease(code)
 
-    doDelay()
+    doSyncDelay()
+
+
+@lru_cache(maxsize=128)
+def parseKeyCombo(comboString):
+    """
+    Turn a key combo string like '<Control><Alt>p' into the keycodes to
+    press: a tuple of the modifiers' keycodes and the final key's keycode.
+    The results are kept until the keymap changes.
+    """
+
+    debug_log("parseKeyCombo(comboString=%s)" % comboString)
+
+    strings = []
+    for s in comboString.split('<'):
+        if s:
+            for S in s.split('>'):
+                if S:
+                    S = keyNameAliases.get(S.lower(), S)
+                    strings.append(S)
+
+    for s in strings:
+        if not hasattr(Gdk, s):
+            if not hasattr(Gdk, "KEY_" + s):
+                raise ValueError("Cannot find key '%s'" % s)
+
+    modifiers = tuple(keyNameToKeyCode(modifier) for modifier in strings[:-1])
+    return modifiers, keyNameToKeyCode(strings[-1])
 
 
 def holdKey(keyName):
@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function, unicode_literals
+from dogtail.config import config
+from dogtail import predicate
+from dogtail import tree
+from dogtail.logging import debug_log
+from dogtail.logging import debugLogger as logger
+from dogtail.utils import getAccessibilityBus
+
+from gi.repository import Gio, GLib
+import pyatspi
+
+"""
+Immutable in-memory copies of the accessible tree
+
+Searching the live tree costs at least one round trip to the application for
+every node and every property the predicate looks at. A Snapshot instead asks
+the application for its whole tree in a single org.a11y.atspi.Cache.GetItems
+call and keeps it as compact SnapshotNode records, which can then be searched
+any number of times without talking to the application at all:
+
+    snapshot = app.snapshot()
+    button = snapshot.find(GenericPredicate(roleName="push button", name="OK"))
+    button.click()
+
+A SnapshotNode only turns into a live Node when something the snapshot doesn't
+hold is needed, e.g. when an action is performed on it. Anything not defined
+on the record is looked up on the live node, so it can mostly be used just like
+one, but every such lookup talks to the application again; the first one of
+each attribute is logged. The snapshot itself never changes; take a new one
+when the UI has.
+
+Where the application's cache doesn't cover part of the tree (containers
+that manage their descendants aren't cached, and some toolkits don't implement
+the Cache interface at all), that part is read node by node instead.
+"""
+
+CACHE_PATH = "/org/a11y/atspi/cache"
+CACHE_INTERFACE = "org.a11y.atspi.Cache"
+
+
+class SnapshotNode(object):
+    """
+    A single accessible, as it was when the snapshot was taken.
+    """
+
+    __slots__ = ("snapshot", "index", "parentIndex", "childIndexes", "indexInParent",
+                 "name", "role", "roleName", "description", "states")
+
+    def __init__(self, snapshot, index, parentIndex, indexInParent, name, role, description, states):
+        for attribute, value in (("snapshot", snapshot), ("index", index),
+                                 ("parentIndex", parentIndex), ("childIndexes", []),
+                                 ("indexInParent", indexInParent), ("name", name),
+                                 ("role", role), ("roleName", tree.getRoleName(role)),
+                                 ("description", description), ("states", states)):
+            object.__setattr__(self, attribute, value)
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SnapshotNode is immutable")
+
+
+    def __getattr__(self, name):
+        """
+        Anything the snapshot doesn't hold comes from the live node.
+        """
+
+        if name in SnapshotNode.__slots__ or name.startswith("__"):
+            raise AttributeError(name)
+        self.snapshot.noteFallback(name)
+        return getattr(self.live, name)
+
+
+    def __str__(self):
+        return str("[%s | %s] (snapshot)") % (self.roleName, self.name)
+
+
+    def __repr__(self):
+        return str(self)
+
+
+    def __len__(self):
+        return len(self.childIndexes)
+
+
+    def __getitem__(self, index):
+        return self.snapshot.records[self.childIndexes[index]]
+
+
+    @property
+    def parent(self):
+        """
+        The parent record, or None for the node the snapshot was taken of.
+        """
+
+        if self.parentIndex is None:
+            return None
+        return self.snapshot.records[self.parentIndex]
+
+
+    @property
+    def children(self):
+        """
+        A list of the child records.
+        """
+
+        return [self.snapshot.records[i] for i in self.childIndexes]
+
+
+    @property
+    def childCount(self):
+        return len(self.childIndexes)
+
+
+    def getState(self):
+        """
+        The state set as it was when the snapshot was taken, like
+        Node.getState().
+        """
+
+        return tree.stateSetFromStates(self.states)
+
+
+    @property
+    def stateSet(self):
+        return self.getState()
+
+
+    def hasState(self, state):
+        """
+        Was the given state set when the snapshot was taken?
+        """
+
+        return int(state) in self.states
+
+
+    @property
+    def sensitive(self):
+        return self.hasState(pyatspi.STATE_SENSITIVE)
+
+
+    @property
+    def showing(self):
+        return self.hasState(pyatspi.STATE_SHOWING)
+
+
+    @property
+    def focusable(self):
+        return self.hasState(pyatspi.STATE_FOCUSABLE)
+
+
+    @property
+    def focused(self):
+        return self.hasState(pyatspi.STATE_FOCUSED)
+
+
+    @property
+    def checked(self):
+        return self.hasState(pyatspi.STATE_CHECKED)
+
+
+    @property
+    def visible(self):
+        return self.hasState(pyatspi.STATE_VISIBLE)
+
+
+    @property
+    def live(self):
+        """
+        The live Node this record was taken from.
+        """
+
+        return self.snapshot.resolve(self)
+
+
+    def find(self, pred, showingOnly=None):
+        """
+        First record below this one satisfying the predicate, or None.
+        """
+
+        return self.snapshot.find(pred, showingOnly=showingOnly, below=self)
+
+
+    def findAll(self, pred, showingOnly=None):
+        """
+        All records below this one satisfying the predicate.
+        """
+
+        return self.snapshot.findAll(pred, showingOnly=showingOnly, below=self)
+
+
+class Snapshot(object):
+    """
+    Copy of the tree below a node, taken with a single Cache.GetItems call
+    where the application supports it. Use Node.snapshot() to take one.
+    """
+
+    def __init__(self, node):
+        debug_log("Snapshot(node=%s)" % str(node))
+
+        self.node = node
+        self.records = []
+        self.__live = {}
+        self.__fallbacks = set()
+
+        items = self.__fetchItems()
+        objectPath = node.objectPath
+        if items is None or objectPath not in items:
+            self.__walk(node, None, 0)
+        else:
+            self.__build(items, objectPath, None, 0, node)
+        if not self.records:
+            raise tree.SearchError("Could not read the tree below %s for a snapshot" % str(node))
+        self.root = self.records[0]
+
+
+    def __len__(self):
+        return len(self.records)
+
+
+    def __iter__(self):
+        return iter(self.records)
+
+
+    def noteFallback(self, name):
+        """
+        Log the first time a record's attribute has to be read from the live
+        node, as that costs the round trips the snapshot is meant to avoid.
+        """
+
+        if name not in self.__fallbacks:
+            self.__fallbacks.add(name)
+            logger.log("'%s' is not in the snapshot of %s, reading it from the live nodes" %
+                       (name, self.node.getLogString()))
+
+
+    def __fetchItems(self):
+        """
+        Get every item from the application's cache, as a dictionary of
+        object path -> (child count, name, role, description, states,
+        paths of the cached children), or None if the call failed.
+        """
+
+        try:
+            reply = getAccessibilityBus().call_sync(
+                self.node.busName, CACHE_PATH, CACHE_INTERFACE, "GetItems",
+                None, None, Gio.DBusCallFlags.NONE, -1, None)
+        except GLib.GError as e:
+            if config.debugSearching:
+                logger.log("Cache.GetItems failed, walking the tree instead: %s" % e.message)
+            return None
+
+        items = {}
+        children = {}
+        for item in reply.unpack()[0]:
+            if len(item) == 10:
+                # (so)(so)(so)iiassusau: self, app, parent, index in parent,
+                # child count, interfaces, name, role, description, states
+                (path, _), _, (parentPath, _), indexInParent, childCount, _, \
+                    name, role, description, states = item
+                children.setdefault(parentPath, []).append((indexInParent, path))
+                items[path] = [childCount, name, role, description, states, []]
+            else:
+                # (so)(so)(so)a(so)assusau: the older format, which lists
+                # children but has no index in parent or child count
+                (path, _), _, _, childRefs, _, name, role, description, states = item
+                childPaths = [childPath for (childPath, _) in childRefs]
+                items[path] = [len(childPaths), name, role, description, states, childPaths]
+
+        for parentPath, indexedPaths in children.items():
+            if parentPath in items:
+                items[parentPath][5] = [path for (_, path) in sorted(indexedPaths)]
+        return items
+
+
+    def __addRecord(self, parentIndex, indexInParent, name, role, description, states):
+        record = SnapshotNode(self, len(self.records), parentIndex, indexInParent,
+                              name, role, description, states)
+        self.records.append(record)
+        if parentIndex is not None:
+            self.records[parentIndex].childIndexes.append(record.index)
+        return record
+
+
+    def __build(self, items, objectPath, parentIndex, indexInParent, node=None):
+        """
+        Add the record for a cached item and, recursively, those of its children.
+        """
+
+        childCount, name, role, description, states, childPaths = items[objectPath]
+        record = self.__addRecord(parentIndex, indexInParent, name, role,
+                                  description, tree.statesFromBitfield(states))
+
+        if len(childPaths) < childCount or any(p not in items for p in childPaths):
+            # Not (fully) cached, e.g. a table managing its descendants
+            try:
+                children = (node or self.resolve(record)).children
+            except (GLib.GError, LookupError, tree.SearchError):
+                return
+            for i, child in enumerate(children):
+                self.__walk(child, record.index, i)
+        else:
+            for i, childPath in enumerate(childPaths):
+                self.__build(items, childPath, record.index, i)
+
+
+    def __walk(self, node, parentIndex, indexInParent):
+        """
+        Add the record for a live node and, recursively, those of its children.
+        """
+
+        try:
+            states = frozenset(int(s) for s in node.getState().getStates())
+            record = self.__addRecord(parentIndex, indexInParent, node.name, node.role,
+                                      node.description, states)
+        except (GLib.GError, LookupError):
+            return
+        self.__live[record.index] = node
+        try:
+            children = node.children
+        except (GLib.GError, LookupError):
+            return
+        for i, child in enumerate(children):
+            self.__walk(child, record.index, i)
+
+
+    def resolve(self, record):
+        """
+        Get the live Node for a record, following the child indexes down from
+        the node the snapshot was taken of. If the tree has changed so that the
+        path no longer leads to a node with the record's role and name, a search
+        for one is made instead.
+        """
+
+        node = self.__live.get(record.index)
+        if node is not None:
+            return node
+
+        if record.parentIndex is None:
+            node = self.node
+        else:
+            parent = self.resolve(self.records[record.parentIndex])
+            try:
+                node = parent[record.indexInParent]
+                if node is not None and (node.role != record.role or node.name != record.name):
+                    node = None
+            except (GLib.GError, LookupError):
+                node = None
+            if node is None:
+                node = self.node.findChild(
+                    lambda x: x.role == record.role and x.name == record.name,
+                    retry=False, requireResult=False, showingOnly=False)
+            if node is None:
+                raise tree.SearchError("%s is no longer in the tree" % str(record))
+
+        self.__live[record.index] = node
+        return node
+
+
+    def __iterRecords(self, below):
+        """
+        Records below the given one, depth-first.
+        """
+
+        stack = list(reversed(below.childIndexes))
+        while stack:
+            record = self.records[stack.pop()]
+            yield record
+            stack.extend(reversed(record.childIndexes))
+
+
+    def findAll(self, pred, showingOnly=None, below=None):
+        """
+        All records below the given one (by default the node the snapshot was
+        taken of) satisfying the predicate, which can be a Predicate or a
+        function taking a node, just like for Node.findChildren.
+        """
+
+        debug_log("Snapshot.findAll(self, pred=%s, showingOnly=%s)" % (str(pred), str(showingOnly)))
+
+        if isinstance(pred, predicate.Predicate):
+            pred = pred.satisfiedByNode
+        if showingOnly is None:
+            showingOnly = config.searchShowingOnly
+        return [record for record in self.__iterRecords(below or self.root)
+                if (not showingOnly or record.showing) and pred(record)]
+
+
+    def find(self, pred, showingOnly=None, below=None):
+        """
+        First record below the given one (by default the node the snapshot was
+        taken of) satisfying the predicate, or None.
+        """
+
+        debug_log("Snapshot.find(self, pred=%s, showingOnly=%s)" % (str(pred), str(showingOnly)))
+
+        if isinstance(pred, predicate.Predicate):
+            pred = pred.satisfiedByNode
+        if showingOnly is None:
+            showingOnly = config.searchShowingOnly
+        for record in self.__iterRecords(below or self.root):
+            if (not showingOnly or record.showing) and pred(record):
+                return record
+        return None
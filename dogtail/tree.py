@@ -7,11 +7,16 @@ from dogtail import rawinput
 from dogtail.rawinput import ponytail
 from dogtail.logging import debug_log
 from dogtail.logging import debugLogger as logger
-from dogtail.utils import doDelay, Blinker, Lock
+from dogtail.utils import doDelay, doSyncDelay, waitForIdle, setClipboardText, Blinker, Lock, EventWatcher, pumpEvents, \
+    callAccessibilityBus
 from dogtail.rawinput import SESSION_TYPE, ponytail_check_is_xwayland
 
-from time import sleep
+from time import sleep, time
 from types import LambdaType
+from collections import deque
+from contextlib import contextmanager
+from itertools import chain
+from weakref import WeakValueDictionary
 import gi
 from gi.repository import GLib
 import os
@@ -58,6 +63,10 @@ to the debug log. If it still can't succeed after 'config.searchCutoffCount'
 attempts, it raises an exception containing details of the search. You can see
 all of this process in the debug log by setting 'config.debugSearching' to True
 
+With 'config.searchWaitMode' set to "events", findChild does not repeat the
+search, but waits for the AT-SPI events that could bring a matching node in
+and checks just the nodes they touch.
+
 We also automatically add a short delay after each action
 ('config.defaultDelay' gives the time in seconds). We'd hoped that the search
 backoff and retry code would eliminate the need for this, but unfortunately we
@@ -109,6 +118,255 @@ except (ImportError, ValueError):
 
 haveBeenWarnedAboutActionTypes = False
 haveWarnedAboutChildrenLimit = False
+roleNameTables = {}
+applicationIndexes = {}
+labelIndexes = {}
+labelIndexWatcher = None
+labelIndexOwners = {}
+nodeGenerations = {}
+applicationGenerations = {}
+windowGenerations = {}
+cacheWatcher = None
+cacheHolds = 0
+# The events that can make a node satisfy a search, see Node._waitForChild.
+searchEventTypes = ("object:children-changed:add", "object:property-change:accessible-name",
+                    "object:state-changed:showing")
+knownNodes = WeakValueDictionary()
+
+
+def getRoleNameTable():
+    """
+    Get the table of AT-SPI role -> role name, as Node.roleName reports it
+    (with config.buttonRoleCompat applied), for every role pyatspi has a
+    ROLE_ constant for. Each table is built once and then reused.
+    """
+
+    compat = bool(config.buttonRoleCompat)
+    table = roleNameTables.get(compat)
+    if table is None:
+        table = {}
+        for constant in dir(pyatspi):
+            if constant.startswith("ROLE_"):
+                role = getattr(pyatspi, constant)
+                roleName = pyatspi.Atspi.role_get_name(role)
+                if compat and roleName == "button":
+                    roleName = "push button"
+                table[role] = roleName
+        roleNameTables[compat] = table
+    return table
+
+
+def getRoleName(role):
+    """
+    Role name for the given AT-SPI role, as Node.roleName would report it.
+    """
+
+    roleName = getRoleNameTable().get(role)
+    if roleName is None:
+        roleName = pyatspi.Atspi.role_get_name(role)
+        if config.buttonRoleCompat and roleName == "button":
+            roleName = "push button"
+    return roleName
+
+
+def statesFromBitfield(bitfield):
+    """
+    Turn the two 32 bit words AT-SPI uses to send a state set into a frozenset
+    of the states (as integers) which are set.
+    """
+
+    states = set()
+    for word, bits in enumerate(bitfield):
+        for bit in range(32):
+            if bits & (1 << bit):
+                states.add(word * 32 + bit)
+    return frozenset(states)
+
+
+def getRolesNamed(roleName):
+    """
+    Get the list of AT-SPI roles whose role name (as Node.roleName would report
+    it, respecting config.buttonRoleCompat) is the given one.
+    """
+
+    return [role for (role, name) in getRoleNameTable().items() if name == roleName]
+
+
+def cacheEventTypes(mode):
+    """
+    The AT-SPI events that invalidate the values cached in the given
+    config.cacheMode: state, role and window changes for "validated", and also
+    children, any property and bounds changes for "aggressive".
+    """
+
+    if mode == "validated":
+        return ("object:state-changed", "object:property-change:accessible-role", "window:")
+    if mode == "aggressive":
+        return ("object:state-changed", "object:property-change", "object:children-changed",
+                "object:bounds-changed", "window:")
+    return ()
+
+
+def watchCache():
+    """
+    Listen to the events that invalidate the values cached in the current
+    config.cacheMode (see cacheEventTypes), and to nothing when caching is off.
+    Each event bumps the generation of its source node, if a Node for it is
+    around, and of the source's application, window events also that of the
+    application's windows. Values cached on a node are tagged with the
+    generation they were read at, and dropped once it has moved on.
+    """
+
+    global cacheWatcher
+    eventTypes = cacheEventTypes(config.cacheMode)
+    if cacheWatcher is not None and cacheWatcher.eventTypes != eventTypes:
+        cacheWatcher.deregister()
+        cacheWatcher = None
+    if cacheWatcher is None and eventTypes:
+        cacheWatcher = EventWatcher(invalidateCache, *eventTypes)
+        cacheWatcher.register()
+
+
+def invalidateCache(event):
+    try:
+        busName = event.source.busName
+        key = (busName, event.source.objectPath)
+    except (GLib.GError, LookupError, AttributeError):
+        return
+    applicationGenerations[busName] = applicationGenerations.get(busName, 0) + 1
+    if str(event.type).startswith("window:"):
+        windowGenerations[busName] = windowGenerations.get(busName, 0) + 1
+    # Nodes that are not around have nothing cached.
+    if key in knownNodes:
+        nodeGenerations[key] = nodeGenerations.get(key, 0) + 1
+    if len(nodeGenerations) + len(applicationGenerations) > 2 * len(knownNodes) + 256:
+        pruneCacheGenerations()
+
+
+def pruneCacheGenerations():
+    """
+    Forget the generations of nodes no Node is around for any more, and of
+    applications none of whose nodes are, as nothing is cached for them.
+    """
+
+    keys = set(knownNodes.keys())
+    busNames = set(busName for (busName, _) in keys)
+    for key in [key for key in nodeGenerations if key not in keys]:
+        del nodeGenerations[key]
+    for generations in (applicationGenerations, windowGenerations):
+        for busName in [busName for busName in generations if busName not in busNames]:
+            del generations[busName]
+
+
+def cacheGeneration(node, scope="node"):
+    """
+    The current generation of a node, or with scope="application" or
+    scope="window" of the application it belongs to or of its windows.
+    """
+
+    # Reading the key makes the node known, see invalidateCache.
+    key = node.key
+    if scope == "application":
+        return applicationGenerations.get(key[0], 0)
+    if scope == "window":
+        return windowGenerations.get(key[0], 0)
+    return nodeGenerations.get(key, 0)
+
+
+def syncCache():
+    """
+    Dispatch pending AT-SPI events, so that values cached in "validated" mode
+    are checked against up to date generations. Does nothing while the cache
+    is held (see holdCache).
+    """
+
+    if config.cacheMode == "validated" and not cacheHolds:
+        watchCache()
+        pumpEvents()
+
+
+@contextmanager
+def holdCache():
+    """
+    Context for a search, or one attempt of it: pending events are dispatched
+    once when it starts, and with config.cacheMode "validated" values are
+    only cached within it, so reads outside of searches never iterate the
+    main context and no event handlers run in the middle of a search.
+    """
+
+    global cacheHolds
+    syncCache()
+    cacheHolds += 1
+    try:
+        yield
+    finally:
+        cacheHolds -= 1
+
+
+def nodeFromKey(key):
+    """
+    Get the live Node for a key as returned by Node.key, raising SearchError
+    if its application no longer has such an object. Unless the node is still
+    around, this asks the application for the object's parent and index in
+    parent straight over D-Bus, one round trip per level up to the
+    application, and then picks the children back down from there.
+    """
+
+    node = knownNodes.get(key)
+    if node is not None:
+        return node
+
+    busName, objectPath = key
+    application = None
+    for child in root.iterChildren():
+        if satisfiesQuietly(lambda x: x.busName == busName, child):
+            application = child
+            break
+    if application is None:
+        raise SearchError("No application at %s" % busName)
+
+    indexes = []
+    visited = set()
+    path = objectPath
+    while path != application.objectPath:
+        indexReply, parentReply = callAccessibilityBus([
+            (busName, path, "org.a11y.atspi.Accessible", "GetIndexInParent", None),
+            (busName, path, "org.freedesktop.DBus.Properties", "Get",
+             GLib.Variant("(ss)", ("org.a11y.atspi.Accessible", "Parent")))])
+        if indexReply is None or parentReply is None:
+            raise SearchError("No accessible %s at %s" % (objectPath, busName))
+        index = indexReply.unpack()[0]
+        parentBusName, parentPath = parentReply.unpack()[0]
+        if index < 0 or parentBusName != busName or parentPath in visited:
+            raise SearchError("No accessible %s at %s" % (objectPath, busName))
+        indexes.append(index)
+        visited.add(path)
+        path = parentPath
+
+    node = application
+    try:
+        for index in reversed(indexes):
+            node = node[index]
+        if node is None or node.objectPath != objectPath:
+            raise LookupError(objectPath)
+    except (GLib.GError, LookupError):
+        raise SearchError("No accessible %s at %s" % (objectPath, busName))
+    return node
+
+
+def satisfiesQuietly(compare_function, node):
+    """
+    Check a node against a compare function while walking the tree, treating
+    any error (typically from a node that went away) as a mismatch, the way
+    pyatspi.utils does.
+    """
+
+    try:
+        return compare_function(node)
+    except Exception as error:
+        if config.debugSearching:
+            logger.log("Error checking %s against the search, skipping it: %s" % (str(node), str(error)))
+        return False
 
 
 class SearchError(Exception):
@@ -206,7 +464,7 @@ class Action(object):
             self.node.blink()
 
         result = self.__action.doAction(self.__index)
-        doDelay(config.actionDelay)
+        doSyncDelay(config.actionDelay, busName=self.node.busName)
 
         return result
 
@@ -229,6 +487,84 @@ class Node(object):
             self.user_data = {}
 
 
+    def __cacheLookup(self, name, scope="node"):
+        """
+        Get a value cached under the given name, or None if there is none or it
+        is out of date, along with the current generation to store a freshly
+        read value with. With config.cacheMode "validated", nothing is cached
+        outside of searches (see holdCache).
+        """
+
+        if config.cacheMode == "off" or (config.cacheMode == "validated" and not cacheHolds):
+            return None, None
+
+        watchCache()
+
+        self.__setupUserData()
+        generation = cacheGeneration(self, scope)
+        cached = self.user_data.get(name)
+        if cached is not None and cached[0] == generation:
+            return cached[1], generation
+        return None, generation
+
+
+    def __cacheStore(self, name, value, generation):
+        if generation is not None:
+            self.__setupUserData()
+            self.user_data[name] = (generation, value)
+
+
+    def __cached(self, name, compute, scope="node"):
+        """
+        The value cached under the given name, calling compute() to read it
+        again when it is out of date. Scope "node" values depend on this node
+        only; scope "application" ones are dropped on any change in the
+        application, scope "window" ones when any of its windows changes.
+        """
+
+        value, generation = self.__cacheLookup(name, scope)
+        if value is None:
+            value = compute()
+            self.__cacheStore(name, value, generation)
+        return value
+
+
+    def __derivedLookup(self, name):
+        """
+        Get a (value, sources) pair cached under the given name by
+        __derivedStore, or None if there is none or any of the nodes the value
+        was derived from has changed since. Only with config.cacheMode
+        "aggressive", as that is when children and name changes are listened to.
+        """
+
+        if config.cacheMode != "aggressive":
+            return None
+
+        watchCache()
+
+        self.__setupUserData()
+        cached = self.user_data.get(name)
+        if cached is not None and all(cacheGeneration(node) == generation
+                                      for (node, generation) in cached[1]):
+            return cached
+        return None
+
+
+    def __derivedStore(self, name, value, sources):
+        """
+        Cache a value derived from several nodes, sources being the
+        (node, generation) pairs of those nodes as they were read.
+        """
+
+        if config.cacheMode == "aggressive":
+            self.__setupUserData()
+            self.user_data[name] = (value, tuple(sources))
+
+
+    def __cacheSource(self):
+        return (self, cacheGeneration(self))
+
+
     @property
     def debugName(self):
         """
@@ -272,47 +608,61 @@ class Node(object):
     @property
     def children(self):
         """
-        A list of this Accessible's children.
+        A list of this Accessible's children, see iterChildren.
         """
 
         debug_log("children(self)")
 
-        if self.parent and self.parent.roleName == "hyper link":
-            debug_log(self.parent.role)
-            return []
+        if config.cacheMode == "aggressive":
+            return list(self.__cached("children", lambda: list(self.iterChildren())))
+        return list(self.iterChildren())
 
-        children_list = []
-        childCount = self.childCount
-        if childCount > config.childrenLimit:
-            global haveWarnedAboutChildrenLimit
-            if not haveWarnedAboutChildrenLimit:
-                logger.log("Only returning %s children. You may change "
-                           "config.childrenLimit if you wish. This message will only"
-                           " be printed once." % str(config.childrenLimit))
-                haveWarnedAboutChildrenLimit = True
-                childCount = config.childrenLimit
 
-        for i in range(childCount):
-            """
-            Workaround for GNOME bug #465103
-            also solution for GNOME bug #321273
-            """
+    def iterChildren(self):
+        """
+        Yields this Accessible's children, at most config.childrenLimit of
+        them, followed by the objects of its hyperlinks if it has any. Where
+        the application supports the Collection interface, the children are
+        fetched with a single call; otherwise one by one, as they are consumed.
+        """
 
-            try:
-                child = self[i]
-            except LookupError:
-                child = None
+        debug_log("iterChildren(self)")
+
+        if self.parent and self.parent.roleName == "hyper link":
+            debug_log(self.parent.role)
+            return
 
-            if child:
-                children_list.append(child)
+        limit = config.childrenLimit
+        childCount = min(self.childCount, limit + 1)
+        children = self.__fetchChildren(childCount)
+        if children is None:
+            children = self.__iterChildrenByIndex(childCount)
+
+        invalidChildren = 0
+        for position, child in enumerate(children):
+            if position == limit:
+                global haveWarnedAboutChildrenLimit
+                if not haveWarnedAboutChildrenLimit:
+                    logger.log("Only returning %s children. You may change "
+                               "config.childrenLimit if you wish. This message will only"
+                               " be printed once." % str(config.childrenLimit))
+                    haveWarnedAboutChildrenLimit = True
+                break
+
+            if child is None:
+                invalidChildren += 1
+            else:
+                yield child
 
-        invalidChildren = childCount - len(children_list)
         if invalidChildren and config.debugSearching:
             logger.log(str("Skipped %s invalid children of %s") %
                        (invalidChildren, str(self)))
 
         try:
+            if "Hypertext" not in self.get_interfaces():
+                return
             ht = self.queryHypertext()
+            anchors = []
             for li in range(ht.getNLinks()):
                 link = ht.getLink(li)
                 for ai in range(link.nAnchors):
@@ -325,28 +675,147 @@ class Node(object):
                                    hypertext=ht,
                                    linkIndex=li,
                                    anchorIndex=ai)
-                    children_list.append(child)
-        except (NotImplementedError, AttributeError):
-            pass
+                    anchors.append(child)
+        except (GLib.GError, NotImplementedError, AttributeError):
+            return
+
+        for child in anchors:
+            yield child
+
+
+    def __iterChildrenByIndex(self, childCount):
+        """
+        Yields the first childCount children, fetching them one at a time.
+        Children that can't be fetched come out as None.
+        """
+
+        for i in range(childCount):
+            """
+            Workaround for GNOME bug #465103
+            also solution for GNOME bug #321273
+            """
 
-        return children_list
+            try:
+                yield self[i]
+            except LookupError:
+                yield None
+
+
+    def __fetchChildren(self, childCount):
+        """
+        Get the first childCount children with a single Collection call matching
+        every direct child. Returns None if that wouldn't save any calls, the
+        application doesn't support it, or the answer doesn't add up.
+        """
+
+        if childCount < 2:
+            return None
+
+        Atspi = pyatspi.Atspi
+        try:
+            collection = self.get_collection_iface()
+            if collection is None:
+                return None
+
+            rule = Atspi.MatchRule.new(Atspi.StateSet.new([]), Atspi.CollectionMatchType.ALL,
+                                       {}, Atspi.CollectionMatchType.ALL,
+                                       [], Atspi.CollectionMatchType.ALL,
+                                       [], Atspi.CollectionMatchType.ALL,
+                                       False)
+            children = [child for child in
+                        Atspi.Collection.get_matches(collection, rule, Atspi.CollectionSortOrder.CANONICAL,
+                                                     childCount, False)
+                        if child is not None and child != self]
+
+            if len(children) != childCount:
+                debug_log("Collection returned %i children of %s, expected %i" % (len(children), str(self), childCount))
+                return None
+            return children
+
+        except (GLib.GError, NotImplementedError, AttributeError) as error:
+            debug_log("Collection unavailable for children of %s: %s" % (str(self), str(error)))
+            return None
+
+
+    def __getRole(self):
+        """
+        The AT-SPI role of the node, cached (see config.cacheMode).
+        """
+
+        return self.__cached("role", lambda: pyatspi.Atspi.Accessible.get_role(self))
 
 
     @property
     def roleName(self):
         """
         Return the role name of the node, with optional button compatibility.
+        It is looked up locally from the role, see getRoleNameTable.
         """
-        role_name = Accessibility.Accessible.getRoleName(self)
-        if config.buttonRoleCompat and role_name == "button":
-            return "push button"
-        return role_name
-    role = property(Accessibility.Accessible.getRole)
+        return getRoleName(self.__getRole())
+    role = property(__getRole)
     name = property(Accessibility.Accessible.name)
     parent = property(Accessibility.Accessible.parent)
     indexInParent = property(Accessibility.Accessible.getIndexInParent)
     attributesList = property(Accessibility.Accessible.getAttributes)
-    __window_id = None
+
+
+    @property
+    def busName(self):
+        """
+        The unique D-Bus name of the application this Accessible belongs to.
+        """
+
+        return self.app.bus_name
+
+
+    @property
+    def objectPath(self):
+        """
+        The D-Bus object path of this Accessible within its application.
+        """
+
+        return self.path
+
+
+    @property
+    def key(self):
+        """
+        An immutable (bus name, object path) tuple identifying this Accessible.
+        Nodes compare and hash by it, so they can be kept in sets and used as
+        dictionary keys; nodeFromKey() turns a key back into a live Node.
+        """
+
+        self.__setupUserData()
+        key = self.user_data.get("key")
+        if key is None:
+            key = (self.busName, self.objectPath)
+            self.user_data["key"] = key
+            knownNodes[key] = self
+        return key
+
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Node):
+            return NotImplemented
+        try:
+            return self.key == other.key
+        except (GLib.GError, LookupError, AttributeError):
+            return False
+
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+
+    def __hash__(self):
+        # The key is kept from the first time it is read, so the hash never
+        # changes; a node that went away before that can't be hashed.
+        return hash(self.key)
 
 
     @property
@@ -360,46 +829,42 @@ class Node(object):
         if SESSION_TYPE == "x11":
             return None
 
-        if self.__window_id is None:
-            debug_log("Window id event.")
+        return self.__cached("window_id", self.__findWindowId, scope="window")
 
-            window_list = ponytail.window_list
-            if len(window_list) == 0:
-                doDelay(config.actionDelay)
-                window_list = ponytail.window_list
 
-            for window in window_list:
-                if "title" not in window.keys():
-                    window["title"] = ""
+    def __findWindowId(self):
+        debug_log("Window id event.")
 
-            node = self
-            parent_list = [node]
-            while node.parent is not None:
-                parent_list.append(node.parent)
-                node = node.parent
+        window_list = ponytail.window_list
+        if len(window_list) == 0:
+            doDelay(config.actionDelay)
+            window_list = ponytail.window_list
+
+        for window in window_list:
+            if "title" not in window.keys():
+                window["title"] = ""
 
-            for ancestor in parent_list:
-                if ancestor.parent is None:
-                    self.__window_id = [x["id"] for x in window_list if bool(x["has-focus"]) is True][0]
-                    return [x["id"] for x in window_list if bool(x["has-focus"]) is True][0]
+        node = self
+        parent_list = [node]
+        while node.parent is not None:
+            parent_list.append(node.parent)
+            node = node.parent
 
-                elif ancestor.parent.roleName == "application" and ancestor.parent.name == "gnome-shell":
-                    return ""
+        for ancestor in parent_list:
+            if ancestor.parent is None:
+                return [x["id"] for x in window_list if bool(x["has-focus"]) is True][0]
 
-                elif ancestor.parent.roleName == "application" and ancestor.roleName == "window" and ancestor.name == "":
-                    self.__window_id = [x["id"] for x in window_list if bool(x["has-focus"]) is True][0]
-                    return [x["id"] for x in window_list if bool(x["has-focus"]) is True][0] # context menus
+            elif ancestor.parent.roleName == "application" and ancestor.parent.name == "gnome-shell":
+                return ""
 
-                elif ancestor.parent.roleName == "application" and ancestor.name in [x["title"] for x in window_list]:
-                    self.__window_id = [x["id"] for x in window_list if x["title"] == ancestor.name][0]
-                    return [x["id"] for x in window_list if x["title"] == ancestor.name][0]
+            elif ancestor.parent.roleName == "application" and ancestor.roleName == "window" and ancestor.name == "":
+                return [x["id"] for x in window_list if bool(x["has-focus"]) is True][0] # context menus
 
-                elif ancestor.parent.roleName == "application":
-                    self.__window_id = [x["id"] for x in window_list if bool(x["has-focus"]) is True][0]
-                    return [x["id"] for x in window_list if bool(x["has-focus"]) is True][0]
+            elif ancestor.parent.roleName == "application" and ancestor.name in [x["title"] for x in window_list]:
+                return [x["id"] for x in window_list if x["title"] == ancestor.name][0]
 
-        else:
-            return self.__window_id
+            elif ancestor.parent.roleName == "application":
+                return [x["id"] for x in window_list if bool(x["has-focus"]) is True][0]
 
 
     @property
@@ -439,6 +904,20 @@ class Node(object):
         raise ActionNotSupported(name, self)
 
 
+    def waitForIdle(self, quietPeriod=0.05, timeout=None):
+        """
+        Wait until this node's application has sent no AT-SPI events for
+        quietPeriod seconds (any application's, for the desktop), at most
+        timeout seconds (config.actionDelay by default). Returns True if it
+        went quiet, False on timeout. See also config.syncMode.
+        """
+
+        debug_log("waitForIdle(self, quietPeriod=%s, timeout=%s)" % (str(quietPeriod), str(timeout)))
+
+        busName = None if self.parent is None else self.busName
+        return waitForIdle(quietPeriod=quietPeriod, timeout=timeout, busName=busName)
+
+
     @property
     def actions(self):
         """
@@ -634,6 +1113,12 @@ class Node(object):
 
         debug_log("extents(self)")
 
+        if config.cacheMode == "aggressive":
+            return self.__cached("extents", self.__readExtents, scope="application")
+        return self.__readExtents()
+
+
+    def __readExtents(self):
         try:
             ex = self.queryComponent().getExtents(pyatspi.DESKTOP_COORDS)
             if (ex.x, ex.y) == (0,0):
@@ -757,7 +1242,7 @@ class Node(object):
                     (str(self.name), self.getLogString(), str(clickX), str(clickY)))
             debug_log("click(self, button=%s)" % str(button))
 
-            rawinput.click(clickX, clickY, button, window_id=self.window_id)
+            rawinput.click(clickX, clickY, button, window_id=self.window_id, busName=self.busName)
 
 
     def doubleClick(self, button=1):
@@ -773,7 +1258,7 @@ class Node(object):
                        (str(self.name), self.getLogString(), str(clickX), str(clickY)))
         debug_log("doubleClick(self, button=%s)" % str(button))
 
-        rawinput.doubleClick(clickX, clickY, button, window_id=self.window_id)
+        rawinput.doubleClick(clickX, clickY, button, window_id=self.window_id, busName=self.busName)
 
 
     def point(self, mouseDelay=None):
@@ -788,7 +1273,7 @@ class Node(object):
                    (str(self.name), self.getLogString(), str(pointX), str(pointY)))
         debug_log("point(self, mouseDelay=%s)" % str(mouseDelay))
 
-        rawinput.point(pointX, pointY, window_id=self.window_id)
+        rawinput.point(pointX, pointY, window_id=self.window_id, busName=self.busName)
 
 
     @property
@@ -840,6 +1325,17 @@ class Node(object):
     labellee = labelee
 
 
+    @property
+    def stateSet(self):
+        """
+        The state set of the Accessible. It is cached (see config.cacheMode), so
+        reading several states costs a single call. The properties below
+        (sensitive, showing, focused...) all use it.
+        """
+
+        return self.__cached("stateSet", self.getState)
+
+
     @property
     def sensitive(self):
         """
@@ -848,7 +1344,7 @@ class Node(object):
 
         debug_log("sensitive(self)")
 
-        return self.getState().contains(pyatspi.STATE_SENSITIVE)
+        return self.stateSet.contains(pyatspi.STATE_SENSITIVE)
 
 
     @property
@@ -859,7 +1355,7 @@ class Node(object):
 
         debug_log("showing(self)")
 
-        return self.getState().contains(pyatspi.STATE_SHOWING)
+        return self.stateSet.contains(pyatspi.STATE_SHOWING)
 
 
     @property
@@ -870,7 +1366,7 @@ class Node(object):
 
         debug_log("focusable(self)")
 
-        return self.getState().contains(pyatspi.STATE_FOCUSABLE)
+        return self.stateSet.contains(pyatspi.STATE_FOCUSABLE)
 
 
     @property
@@ -881,7 +1377,7 @@ class Node(object):
 
         debug_log("focused(self)")
 
-        return self.getState().contains(pyatspi.STATE_FOCUSED)
+        return self.stateSet.contains(pyatspi.STATE_FOCUSED)
 
 
     @property
@@ -892,7 +1388,7 @@ class Node(object):
 
         debug_log("Node.checked - is the Accessible a checked checkbox?")
 
-        return self.getState().contains(pyatspi.STATE_CHECKED)
+        return self.stateSet.contains(pyatspi.STATE_CHECKED)
 
 
     @property
@@ -916,7 +1412,7 @@ class Node(object):
 
         debug_log("visible(self)")
 
-        return self.getState().contains(pyatspi.STATE_VISIBLE)
+        return self.stateSet.contains(pyatspi.STATE_VISIBLE)
 
 
     def selectAll(self):
@@ -989,7 +1485,15 @@ class Node(object):
             parent = self.parent
         except AttributeError:
             raise NotImplementedError
-        return parent.querySelection().isChildSelected(self.indexInParent)
+        try:
+            return parent.querySelection().isChildSelected(self.indexInParent)
+        except NotImplementedError:
+            # Without a Selection on the parent, selectable nodes still carry
+            # their selection in their state set.
+            stateSet = self.stateSet
+            if stateSet.contains(pyatspi.STATE_SELECTABLE):
+                return stateSet.contains(pyatspi.STATE_SELECTED)
+            raise
 
 
     @property
@@ -1085,29 +1589,162 @@ class Node(object):
             pass
 
 
-    def typeText(self, string):
+    def typeText(self, string, method="keys", verify=False):
         """
         Type the given text into the node, with appropriate delays and logging.
+
+        method is one of:
+            - "keys" types the text key by key (paced according to
+              config.typingMode), or inserts it if the node is not focusable,
+            - "insert" inserts it at the caret through the EditableText
+              interface, without any key events,
+            - "paste" puts it on the clipboard and presses <Control>v, then
+              reads the text back, inserting or typing the string instead if
+              the paste changed nothing,
+            - "auto" inserts strings of config.typingInsertThreshold or more
+              characters where the node supports EditableText, and types
+              anything else. It never pastes, as that would overwrite the
+              user's clipboard.
+
+        With verify=True, check afterwards that the node's text contains the
+        string and return whether it does.
         """
 
         logger.log(str("Typing text into %s: '%s'") % (self.getLogString(), str(string)))
-        debug_log("typeText(self, string=%s)" % string)
+        debug_log("typeText(self, string=%s, method=%s, verify=%s)" % (string, str(method), str(verify)))
 
-        if self.focusable:
-            if not self.focused:
-                try:
-                    self.grabFocus()
-                except Exception:
-                    logger.log("Node is focusable but I can't grabFocus!")
+        if method == "auto":
+            if len(string) >= config.typingInsertThreshold and "EditableText" in self.get_interfaces():
+                method = "insert"
+            else:
+                method = "keys"
 
-            rawinput.typeText(string)
+        if method == "keys":
+            if self.focusable:
+                self.__focusForTyping()
+                if config.typingMode == "events":
+                    self.__typeAcknowledged(string)
+                else:
+                    rawinput.typeText(string)
+            else:
+                logger.log("Node is not focusable; falling back to inserting text")
+                self.__insertText(string)
+
+        elif method == "insert":
+            self.__insertText(string)
+
+        elif method == "paste":
+            self.__pasteText(string)
+
+        else:
+            raise ValueError("Unknown typing method '%s', expected 'keys', 'insert', 'paste' or 'auto'" %
+                             str(method))
+
+        if verify:
+            return self.__verifyTyped(string)
+
+
+    def __focusForTyping(self):
+        if self.focusable and not self.focused:
+            try:
+                self.grabFocus()
+            except Exception:
+                logger.log("Node is focusable but I can't grabFocus!")
+
+
+    def __insertText(self, string):
+        et = self.queryEditableText()
+        offset = self.caretOffset
+        if offset == 0 and self.get_character_count() == 0:
+            et.setTextContents(string)
+        else:
+            et.insertText(offset, string, len(string))
+        self.caretOffset = offset + len(string)
+        doSyncDelay(busName=self.busName)
+
+
+    def __pasteText(self, string):
+        """
+        Paste the string, then read the text back. If it did not change at all
+        (the application ignored <Control>v, or the clipboard never got
+        there), the string is inserted instead, or typed where the node has no
+        EditableText interface.
+        """
 
+        self.__focusForTyping()
+        before = self.text or ""
+        setClipboardText(string)
+        rawinput.keyCombo("<Control>v")
+
+        def pasted():
+            text = self.text or ""
+            return text != before and string in text
+
+        # Keep answering the application's clipboard requests until the text
+        # has arrived, in case no clipboard manager took it over.
+        if pumpEvents(config.actionDelay, until=pasted):
+            return
+
+        if (self.text or "") != before:
+            logger.log("Warning: pasting into %s changed its text, but not to contain '%s'" %
+                       (self.getLogString(), string))
+        elif "EditableText" in self.get_interfaces():
+            logger.log("Pasting into %s changed nothing; falling back to inserting text" % self.getLogString())
+            self.__insertText(string)
         else:
-            logger.log("Node is not focusable; falling back to inserting text")
-            et = self.queryEditableText()
-            et.insertText(self.caretOffset, string, len(string))
-            self.caretOffset += len(string)
-            doDelay()
+            logger.log("Pasting into %s changed nothing; falling back to typing text" % self.getLogString())
+            rawinput.typeText(string)
+
+
+    def __typeAcknowledged(self, string):
+        """
+        Type the string with no delay between the keys, waiting only while
+        more than config.typingWindow of them have not been acknowledged by a
+        text-changed:insert (counting the characters inserted) or
+        text-caret-moved event from this node.
+        """
+
+        key = self.key
+        inserted = [0]
+        caretMoves = [0]
+
+        def onEvent(event):
+            try:
+                if event.source.key != key:
+                    return
+            except (GLib.GError, LookupError, AttributeError):
+                return
+            if str(event.type).startswith("object:text-changed:insert"):
+                inserted[0] += event.detail2
+            else:
+                caretMoves[0] += 1
+
+        sent = 0
+        def inFlight():
+            return sent - max(inserted[0], caretMoves[0])
+
+        with EventWatcher(onEvent, "object:text-changed:insert", "object:text-caret-moved"):
+            for i, char in enumerate(string):
+                if inFlight() >= config.typingWindow and \
+                        not pumpEvents(config.actionDelay, until=lambda: inFlight() < config.typingWindow):
+                    logger.log("Typing into %s is not being acknowledged, typing the rest with delays" %
+                               self.getLogString())
+                    rawinput.typeText(string[i:])
+                    return
+                rawinput.pressKey(char, delay=0)
+                sent += 1
+                pumpEvents()
+
+            if not pumpEvents(config.actionDelay, until=lambda: inFlight() <= 0):
+                logger.log("Typing into %s: %d keys were not acknowledged" % (self.getLogString(), inFlight()))
+
+
+    def __verifyTyped(self, string):
+        text = self.text
+        if text is not None and string in text:
+            return True
+        logger.log("Warning: typed '%s' but the text of %s is '%s'" % (string, self.getLogString(), str(text)))
+        return False
 
 
     def keyCombo(self, comboString):
@@ -1147,34 +1784,114 @@ class Node(object):
             return str(self)
 
 
-    def satisfies(self, pred):
+    def prefetch(self, properties=("name", "role", "description", "childCount")):
         """
-        Does this node satisfy the given predicate?
+        Fetch the given properties of this node from the application at once,
+        returning a PrefetchedNode that answers them without further calls.
+        name, description, childCount and accessibleId come in a single
+        org.freedesktop.DBus.Properties.GetAll call; role (and roleName),
+        states and attributes each need a call of their own, but all the calls
+        are in flight at the same time, so it costs about one round trip.
+        See prefetchAll() for doing the same for several nodes at once.
+
+        The values are not kept up to date, so use the result for the
+        evaluation at hand (e.g. predicate.satisfiedByNode(node.prefetch(...)))
+        and fetch again later.
         """
 
-        debug_log("satisfies(self, pred=%s)" % (str(pred)))
+        debug_log("prefetch(self, properties=%s)" % str(properties))
 
-        assert isinstance(pred, predicate.Predicate)
-        return pred.satisfiedByNode(self)
+        return prefetchAll([self], properties)[0]
 
 
-    def dump(self, type="plain", fileName=None):
+    def _prefetchCalls(self, properties):
         """
-        Dumping a tree structure of the node.
+        The role cached for this node (or None), its generation and the D-Bus
+        calls (as for utils.callAccessibilityBus) prefetching the properties
+        takes, by method.
         """
 
-        debug_log("dump(self, type=%s, fileName=%s)" % (str(type), str(fileName)))
+        role, generation = self.__cacheLookup("role")
 
-        from dogtail import dump
-        dumper = getattr(dump, type)
-        dumper(self, fileName)
+        calls = {}
+        for name in properties:
+            if name not in PrefetchedNode.sources:
+                raise ValueError("Can't prefetch '%s', only %s" %
+                                 (name, ", ".join(sorted(PrefetchedNode.sources))))
+            method, argument = PrefetchedNode.sources[name][:2]
+            if method == "GetRole" and role is not None:
+                continue
+            interface = "org.freedesktop.DBus.Properties" if method == "GetAll" else "org.a11y.atspi.Accessible"
+            calls[method] = (self.busName, self.objectPath, interface, method, argument)
+        return role, generation, calls
 
 
-    def getAbsoluteSearchPath(self):
+    def _prefetched(self, properties, role, generation, replies):
         """
-        Generate a SearchPath instance giving the 'best'
-        way to find the Accessible wrapped by this node again, starting
-        at the root and applying each search in turn.
+        The PrefetchedNode for the replies (by method) to the calls from
+        _prefetchCalls, also caching the role and states they brought.
+        """
+
+        values = {}
+        if role is not None:
+            values["role"] = role
+        for name in properties:
+            method, _, convert = PrefetchedNode.sources[name]
+            if replies.get(method) is not None:
+                try:
+                    values[name] = convert(replies[method].unpack()[0])
+                except (KeyError, ValueError, TypeError):
+                    debug_log("No %s in the prefetched %s of %s" % (name, method, str(self)))
+        if role is None and "role" in values:
+            self.__cacheStore("role", values["role"], generation)
+        if "states" in values:
+            self.__cacheStore("stateSet", values["states"], generation)
+        return PrefetchedNode(self, values)
+
+
+    def satisfies(self, pred):
+        """
+        Does this node satisfy the given predicate?
+        """
+
+        debug_log("satisfies(self, pred=%s)" % (str(pred)))
+
+        assert isinstance(pred, predicate.Predicate)
+        return pred.satisfiedByNode(self)
+
+
+    def dump(self, type="plain", fileName=None):
+        """
+        Dumping a tree structure of the node.
+        """
+
+        debug_log("dump(self, type=%s, fileName=%s)" % (str(type), str(fileName)))
+
+        from dogtail import dump
+        dumper = getattr(dump, type)
+        dumper(self, fileName)
+
+
+    def snapshot(self):
+        """
+        Take an immutable in-memory copy of the tree below this node, fetched
+        from the application in a single call where it supports the AT-SPI
+        Cache interface. Searching the snapshot (find/findAll) costs no calls
+        to the application; a record found there turns back into a live node
+        as soon as it is acted upon. See dogtail.snapshot.
+        """
+
+        debug_log("snapshot(self)")
+
+        from dogtail.snapshot import Snapshot
+        return Snapshot(self)
+
+
+    def getAbsoluteSearchPath(self):
+        """
+        Generate a SearchPath instance giving the 'best'
+        way to find the Accessible wrapped by this node again, starting
+        at the root and applying each search in turn.
 
         This is somewhat analagous to an absolute path in a filesystem,
         except that some of searches may be recursive, rather than just
@@ -1183,6 +1900,9 @@ class Node(object):
         Used by the recording framework for identifying nodes in a
         persistent way, independent of the style of script being
         written.
+
+        Search paths are cached (see config.cacheMode) until any of the nodes
+        they were derived from changes.
         """
 
         debug_log("getAbsoluteSearchPath(self)")
@@ -1190,24 +1910,43 @@ class Node(object):
         if config.debugSearchPaths:
             logger.log("getAbsoluteSearchPath(%s)" % self)
 
+        result = self.__absoluteSearchPath()[0]
+        return result.getPrefix(result.length())
+
+
+    def __absoluteSearchPath(self):
+        """
+        The absolute SearchPath of this node along with the sources it was
+        derived from, see __derivedStore. Not to be modified.
+        """
+
+        cached = self.__derivedLookup("absoluteSearchPath")
+        if cached is not None:
+            return cached
+
         if self.roleName == "application":
             result = path.SearchPath()
-            result.append(predicate.IsAnApplicationNamed(self.name), False)
-            return result
+            result.append(predicate.IsAnApplicationNamed(self.name), False,
+                          self.__childIndexes([self]))
+            sources = (self.__cacheSource(),)
 
-        else:
-            if self.parent:
-                (ancestor, pred, isRecursive) = self.getRelativeSearch()
-                if config.debugSearchPaths:
-                    debug_log("Found ancestor: %s" % ancestor)
+        elif self.parent:
+            (ancestor, pred, isRecursive, hint), sources = self.__relativeSearch()
+            if config.debugSearchPaths:
+                debug_log("Found ancestor: %s" % ancestor)
 
-                ancestorPath = ancestor.getAbsoluteSearchPath()
-                ancestorPath.append(pred, isRecursive)
-                return ancestorPath
+            ancestorPath, ancestorSources = ancestor.__absoluteSearchPath()
+            result = ancestorPath.getPrefix(ancestorPath.length())
+            result.append(pred, isRecursive, hint)
+            sources = sources + ancestorSources
 
-            else:
-                # This should be the root node:
-                return path.SearchPath()
+        else:
+            # This should be the root node:
+            result = path.SearchPath()
+            sources = (self.__cacheSource(),)
+
+        self.__derivedStore("absoluteSearchPath", result, sources)
+        return result, sources
 
 
     def getRelativeSearch(self):
@@ -1221,41 +1960,79 @@ class Node(object):
         if config.debugSearchPaths:
             logger.log("getRelativeSearchPath(%s)" % self)
 
+        return self.__relativeSearch()[0][:3]
+
+
+    def __relativeSearch(self):
+        """
+        The relative search triple of this node, extended with the child
+        indexes leading from the ancestor to this node (see path.SearchPath),
+        along with the sources it was derived from: this node, the ancestors
+        looked at and the labellee.
+        """
+
+        cached = self.__derivedLookup("relativeSearch")
+        if cached is not None:
+            return cached
+
         assert self
         assert self.parent
 
+        sources = [self.__cacheSource()]
         isRecursive = False
         ancestor = self.parent
+        sources.append(ancestor.__cacheSource())
+        below = [self]
 
         while not self.__nodeIsIdentifiable(ancestor):
             debug_log("Node is not identifiable, setting isRecursive as True.")
+            below.insert(0, ancestor)
             ancestor = ancestor.parent
+            sources.append(ancestor.__cacheSource())
             isRecursive = True
 
-        # I think this is useless, since only change is the debug string
-
         # Pick the most appropriate predicate for finding this node:
-        if self.labellee:
-            if self.labellee.name:
-                return (ancestor, predicate.IsLabelledAs(self.labellee.name), isRecursive)
-
-        if self.roleName == "menu":
-            return (ancestor, predicate.IsAMenuNamed(self.name), isRecursive)
+        labellee = self.labellee
+        if labellee:
+            sources.append(labellee.__cacheSource())
+
+        if labellee and labellee.name:
+            pred = predicate.IsLabelledAs(labellee.name)
+        elif self.roleName == "menu":
+            pred = predicate.IsAMenuNamed(self.name)
         elif self.roleName == "menu item" or self.roleName == "check menu item":
-            return (ancestor, predicate.IsAMenuItemNamed(self.name), isRecursive)
+            pred = predicate.IsAMenuItemNamed(self.name)
         elif self.roleName == "text":
-            return (ancestor, predicate.IsATextEntryNamed(self.name), isRecursive)
+            pred = predicate.IsATextEntryNamed(self.name)
         elif self.roleName == "button":
-            return (ancestor, predicate.IsAButtonNamed(self.name), isRecursive)
+            pred = predicate.IsAButtonNamed(self.name)
         elif self.roleName == "push button":
-            return (ancestor, predicate.IsAButtonNamed(self.name), isRecursive)
+            pred = predicate.IsAButtonNamed(self.name)
         elif self.roleName == "frame":
-            return (ancestor, predicate.IsAWindowNamed(self.name), isRecursive)
+            pred = predicate.IsAWindowNamed(self.name)
         elif self.roleName == "dialog":
-            return (ancestor, predicate.IsADialogNamed(self.name), isRecursive)
+            pred = predicate.IsADialogNamed(self.name)
         else:
             pred = predicate.GenericPredicate(name=self.name, roleName=self.roleName)
-            return (ancestor, pred, isRecursive)
+
+        result = ((ancestor, pred, isRecursive, self.__childIndexes(below)), tuple(sources))
+        self.__derivedStore("relativeSearch", result[0], result[1])
+        return result
+
+
+    def __childIndexes(self, nodes):
+        """
+        The indexes in parent of the given nodes, or None if any of them
+        can't be told.
+        """
+
+        try:
+            indexes = [node.indexInParent for node in nodes]
+        except (GLib.GError, LookupError):
+            return None
+        if any(index < 0 for index in indexes):
+            return None
+        return indexes
 
 
     def __nodeIsIdentifiable(self, ancestor):
@@ -1278,43 +2055,571 @@ class Node(object):
             return False
 
 
-    def _fastFindChild(self, pred, recursive=True, showingOnly=None):
+    def _collectionMatches(self, pred, showingOnly=False):
         """
-        Searches for an Accessible using methods from pyatspi.utils
+        Get the descendants of this node that can satisfy the predicate from the
+        application itself, using the AT-SPI Collection interface. This takes a
+        single call instead of walking the tree node by node. Only the roles the
+        predicate declares (and the showing state) are matched by the application,
+        so the candidates still have to be checked against the predicate.
+
+        Returns None if the predicate can't be translated or prunes subtrees,
+        config.searchCollection is off or the application doesn't support Collection.
         """
 
-        debug_log("_fastFindChild(self, pred=%s, recursive=%s, recursive=%s)" %
-                      (str(pred), str(recursive), str(recursive)))
+        if not config.searchCollection or not isinstance(pred, predicate.Predicate) or not pred.roleNames:
+            return None
 
-        if isinstance(pred, predicate.Predicate):
-            pred = pred.satisfiedByNode
+        # The application can't apply the predicate's own prune rules.
+        if predicate.prunesSubtrees(pred):
+            return None
+
+        roles = []
+        for roleName in pred.roleNames:
+            roles.extend(getRolesNamed(roleName))
+        if not roles:
+            return None
+
+        Atspi = pyatspi.Atspi
+        try:
+            collection = self.get_collection_iface()
+            if collection is None:
+                return None
+
+            states = Atspi.StateSet.new([pyatspi.STATE_SHOWING] if showingOnly else [])
+            rule = Atspi.MatchRule.new(states, Atspi.CollectionMatchType.ALL,
+                                       {}, Atspi.CollectionMatchType.ALL,
+                                       roles, Atspi.CollectionMatchType.ANY,
+                                       [], Atspi.CollectionMatchType.ALL,
+                                       False)
+            return Atspi.Collection.get_matches(collection, rule, Atspi.CollectionSortOrder.CANONICAL, 0, True)
+
+        except (GLib.GError, NotImplementedError, AttributeError) as error:
+            debug_log("Collection search unavailable, walking the tree instead: %s" % str(error))
+            return None
+
+
+    def _walk(self, order="dfs", maxDepth=None, prune=None, onChildren=None):
+        """
+        Yields the descendants of this node (not the node itself), either
+        depth-first in pre-order like pyatspi.utils, or breadth-first so that
+        shallow nodes come before deep ones. maxDepth limits how many levels
+        below this node are visited (1 being the direct children, None for no
+        limit). Nodes for which prune(node) is true are yielded, but not
+        descended into. Children that go away while being read are skipped.
+        onChildren, if given, is called with each list of children read before
+        any of them is yielded.
+        """
+
+        if order not in ("dfs", "bfs"):
+            raise ValueError("Unknown search order '%s', expected 'dfs' or 'bfs'" % str(order))
+
+        def descend(node, depth):
+            return (maxDepth is None or depth < maxDepth) and \
+                (prune is None or not satisfiesQuietly(prune, node))
+
+        def childrenOf(node):
+            children = node.__walkChildren()
+            if onChildren is not None and children:
+                onChildren(children)
+            return children
+
+        if order == "bfs":
+            queue = deque([self])
+            depth = 0
+            while queue:
+                level, queue = queue, deque()
+                depth += 1
+                for node in level:
+                    for child in childrenOf(node):
+                        yield child
+                        if descend(child, depth):
+                            queue.append(child)
+
+        else:
+            stack = [(child, 1) for child in reversed(childrenOf(self))]
+            while stack:
+                node, depth = stack.pop()
+                yield node
+                if descend(node, depth):
+                    stack.extend((child, depth + 1) for child in reversed(childrenOf(node)))
+
+
+    def __searchPrune(self, pred, showingOnly, view):
+        """
+        The rule cutting subtrees off a search: nodes that are not showing when
+        only showing nodes are searched for (except applications, which have no
+        showing state), and whatever the predicate prunes. None if nothing is cut.
+        """
+
+        rules = []
+        if showingOnly:
+            rules.append(lambda node: not node.showing and
+                         node.role != pyatspi.ROLE_APPLICATION)
+        if isinstance(pred, predicate.Predicate) and predicate.prunesSubtrees(pred):
+            rules.append(pred.prunes)
+
+        if not rules:
+            return None
+        return lambda node: any(rule(view(node)) for rule in rules)
+
+
+    def __searchView(self, pred, showingOnly):
+        """
+        What a walking search checks in place of each node, and what to pass
+        _walk as onChildren. With config.searchPrefetch on and a predicate
+        declaring the properties it reads, that is the node's PrefetchedNode,
+        shared by the predicate and the prune rules. The nodes are prefetched
+        a child list at a time (see prefetchAll) as the walk reads them.
+        Otherwise it is the node itself.
+        """
+
+        properties = getattr(pred, "requiredProperties", None)
+        if not config.searchPrefetch or properties is None:
+            return (lambda node: node), None
+
+        properties = tuple(properties) + (("states", "role") if showingOnly else ())
+        pending = {}
+        last = [None, None]
+
+        def onChildren(children):
+            for child, prefetched in zip(children, prefetchAll(children, properties)):
+                pending[id(child)] = prefetched
+
+        def view(node):
+            if last[0] is not node:
+                prefetched = pending.pop(id(node), None)
+                if prefetched is None:
+                    prefetched = node.prefetch(properties)
+                last[0], last[1] = node, prefetched
+            return last[1]
+        return view, onChildren
+
+
+    def __walkChildren(self):
+        """
+        The children of this node as seen by _walk.
+        """
+
+        if config.cacheMode == "aggressive":
+            return self.__cached("walkChildren", self.__readWalkChildren)
+        return self.__readWalkChildren()
+
+
+    def __readWalkChildren(self):
+        children = []
+        try:
+            childCount = self.childCount
+        except (GLib.GError, LookupError):
+            return children
+
+        fetched = self.__fetchChildren(childCount)
+        if fetched is not None:
+            return fetched
+
+        for i in range(childCount):
+            try:
+                child = self[i]
+            except (GLib.GError, LookupError):
+                debug_log("Skipping child %i of %s, it went away" % (i, str(self)))
+                continue
+            if child is not None:
+                children.append(child)
+        return children
+
+
+    def _fastFindChild(self, pred, recursive=True, showingOnly=None, order=None, maxDepth=None):
+        """
+        Searches for an Accessible using the Collection interface where possible,
+        otherwise walking the tree in the given order (config.searchOrder by default)
+        """
+
+        debug_log("_fastFindChild(self, pred=%s, recursive=%s, showingOnly=%s, order=%s, maxDepth=%s)" %
+                      (str(pred), str(recursive), str(showingOnly), str(order), str(maxDepth)))
 
         if showingOnly is None:
             showingOnly = config.searchShowingOnly
+        if order is None:
+            order = config.searchOrder
+
+        indexed = self.__indexedMatch(pred, showingOnly, order, maxDepth if recursive else 1)
+        if indexed is None:
+            indexed = self.__labelledMatch(pred, showingOnly, order, maxDepth if recursive else 1)
+        if indexed is not None:
+            return indexed
+
+        candidates = None
+        if recursive:
+            candidates = self._collectionMatches(pred, showingOnly=showingOnly)
+            if candidates is None:
+                return next(self.iterDescendants(pred, order, maxDepth, showingOnly), None)
+
+        if isinstance(pred, predicate.Predicate):
+            pred = pred.satisfiedByNode
+
+        if candidates is not None:
+            # The application matches in depth-first order; the shallowest match
+            # is the breadth-first one.
+            result = None
+            resultDepth = None
+            for candidate in candidates:
+                if not satisfiesQuietly(pred, candidate):
+                    continue
+                if order == "dfs" and maxDepth is None:
+                    return candidate
+                depth = self.__depthBelow(candidate, maxDepth)
+                if depth is None:
+                    continue
+                if order == "dfs" or depth == 1:
+                    return candidate
+                if result is None or depth < resultDepth:
+                    result, resultDepth = candidate, depth
+            return result
 
         if showingOnly:
             original_predicate = pred
-            pred = lambda x: original_predicate(x) and x.getState().contains(pyatspi.STATE_SHOWING)
+            pred = lambda x: original_predicate(x) and x.showing
+
+        cIter = iter(self)
+        while True:
+            try:
+                child = next(cIter)
+            except StopIteration:
+                break
+
+            if child is not None and pred(child):
+                return child
+
 
+    def _waitForChild(self, pred, recursive=True, showingOnly=None, order=None, maxDepth=None):
+        """
+        Searches for an Accessible like _fastFindChild, waiting for it to show up if
+        it is not there yet. Rather than repeating the whole search, it listens to the
+        AT-SPI events that can make a node match and checks only the nodes they touch.
+        Gives up after config.searchCutoffCount * config.searchBackoffDuration seconds.
+        """
+
+        debug_log("_waitForChild(self, pred=%s, recursive=%s, showingOnly=%s, order=%s, maxDepth=%s)" %
+                      (str(pred), str(recursive), str(showingOnly), str(order), str(maxDepth)))
+
+        compare_function = pred
+        if isinstance(pred, predicate.Predicate):
+            compare_function = pred.satisfiedByNode
+
+        if showingOnly is None:
+            showingOnly = config.searchShowingOnly
         if not recursive:
-            cIter = iter(self)
-            while True:
-                try:
-                    child = next(cIter)
-                except StopIteration:
+            maxDepth = 1
+
+        events = []
+        watcher = EventWatcher(events.append, *searchEventTypes)
+
+        deadline = time() + config.searchCutoffCount * config.searchBackoffDuration
+        with watcher:
+            # Listen before the first search, so that nothing changing in between is missed.
+            with holdCache():
+                result = self._fastFindChild(pred, recursive, showingOnly=showingOnly,
+                                             order=order, maxDepth=maxDepth)
+
+            while result is None and time() < deadline:
+                if not pumpEvents(deadline - time(), until=lambda: len(events) > 0):
                     break
 
-                if child is not None and pred(child):
-                    return child
+                with holdCache():
+                    while events and result is None:
+                        result = self.__matchEventTarget(events.pop(0), pred, compare_function,
+                                                         showingOnly, order, maxDepth)
 
-        else:
-            return pyatspi.utils.findDescendant(self, pred)
+        if result is None:
+            # Not everything a predicate can look at (labels, descriptions) has an
+            # event we listen to, so give it one last full search.
+            with holdCache():
+                result = self._fastFindChild(pred, recursive, showingOnly=showingOnly,
+                                             order=order, maxDepth=maxDepth)
+
+        return result
+
+
+    def __matchEventTarget(self, event, pred, compare_function, showingOnly, order, maxDepth):
+        """
+        Checks the node(s) touched by an AT-SPI event, returning the one satisfying
+        the predicate if it is within maxDepth levels below this node.
+        """
+
+        try:
+            if event.type.startswith("object:children-changed"):
+                node = event.any_data
+                checkSubtree = True
+
+            elif event.type.startswith("object:state-changed"):
+                if not event.detail1:
+                    return None
+                node = event.source
+                # Nodes below become eligible only if hidden nodes were filtered out.
+                checkSubtree = showingOnly
+
+            else:
+                node = event.source
+                checkSubtree = False
+
+            if not node:
+                return None
+
+            depth = self.__depthBelow(node, maxDepth)
+            if depth is None:
+                return None
+
+            if satisfiesQuietly(compare_function, node) and \
+                    (not showingOnly or satisfiesQuietly(lambda x: x.showing, node)):
+                return node
+
+            if checkSubtree and (maxDepth is None or depth < maxDepth):
+                return node._fastFindChild(pred, True, showingOnly=showingOnly, order=order,
+                                           maxDepth=None if maxDepth is None else maxDepth - depth)
+
+        except (GLib.GError, LookupError):
+            debug_log("Node from the event went away before it could be checked.")
+
+        return None
+
+
+    def __indexedMatch(self, pred, showingOnly, order, maxDepth):
+        """
+        Look the node up in the index of this node's application, if one was
+        made with Application.index() and the predicate declares the exact names
+        or id to look for. Returns the first match in the search order, or None
+        so that the search walks the tree instead.
+        """
+
+        if not applicationIndexes or not isinstance(pred, predicate.Predicate) or predicate.prunesSubtrees(pred):
+            return None
+
+        names = pred.literalNames()
+        identifier = pred.literalIdentifier()
+        if names is None and identifier is None:
+            return None
+
+        index = applicationIndexes.get(self.busName)
+        if index is None:
+            return None
+
+        candidates = []
+        for roleName in pred.roleNames or (None,):
+            for name in names or (None,):
+                for node in index.lookup(name=name, roleName=roleName, identifier=identifier):
+                    if node not in candidates:
+                        candidates.append(node)
+
+        result = self.__firstCandidate(candidates, pred, showingOnly, order, maxDepth)
+        if config.debugSearching:
+            logger.log("Index lookup for %s: %s" % (pred.describeSearchResult(), str(result)))
+        return result
+
+
+    def __labelledMatch(self, pred, showingOnly, order, maxDepth):
+        """
+        Look a labelled node up in the label indexes of the windows below or
+        around this node, if any were made with labelIndex() and the predicate
+        declares the exact label texts to look for. Returns the first match in
+        the search order, or None so that the search walks the tree instead.
+        """
+
+        if not labelIndexes or not isinstance(pred, predicate.Predicate) or predicate.prunesSubtrees(pred):
+            return None
+
+        labels = pred.literalLabels()
+        if labels is None:
+            return None
+
+        try:
+            if self.roleName == "application":
+                indexes = [index for index in labelIndexes.values() if index.busName == self.busName]
+            else:
+                window = self.topLevel()
+                indexes = [labelIndexes.get(window.key)] if window is not None else []
+        except (GLib.GError, LookupError):
+            return None
+
+        candidates = []
+        for index in indexes:
+            if index is None:
+                continue
+            for text in labels:
+                for node in index.lookup(text):
+                    if node not in candidates:
+                        candidates.append(node)
+
+        result = self.__firstCandidate(candidates, pred, showingOnly, order, maxDepth)
+        if config.debugSearching:
+            logger.log("Label index lookup for %s: %s" % (pred.describeSearchResult(), str(result)))
+        return result
+
+
+    def __firstCandidate(self, candidates, pred, showingOnly, order, maxDepth):
+        """
+        The candidate below this node satisfying the predicate that a search in
+        the given order would find first, or None.
+        """
+
+        result = None
+        resultRank = None
+        for node in candidates:
+            if not satisfiesQuietly(pred.satisfiedByNode, node):
+                continue
+            if showingOnly and not satisfiesQuietly(lambda x: x.showing, node):
+                continue
+            position = self.__positionBelow(node, maxDepth)
+            if position is None:
+                continue
+            rank = (len(position), position) if order == "bfs" else position
+            if result is None or rank < resultRank:
+                result, resultRank = node, rank
+        return result
+
+
+    def topLevel(self):
+        """
+        The window this node is in: its ancestor (or itself) that is a child of
+        an application, or None for applications and the desktop.
+        """
+
+        debug_log("topLevel(self)")
+
+        node = self
+        parent = node.parent
+        while parent is not None and parent.role != pyatspi.ROLE_APPLICATION:
+            node, parent = parent, parent.parent
+        if parent is None:
+            return None
+        return node
+
+
+    def labelIndex(self):
+        """
+        Get the LabelIndex of the window this node is in (see topLevel), making
+        it on the first call, which reads every label of the window once. From
+        then on, searches for nodes labelled with literal texts (childLabelled,
+        IsLabelledAs, GenericPredicate(label=...)) look them up in the index
+        before walking the tree. Returns None outside of windows.
+        """
+
+        debug_log("labelIndex(self)")
+
+        window = self.topLevel()
+        if window is None:
+            return None
+
+        index = labelIndexes.get(window.key)
+        if index is None:
+            index = LabelIndex(window)
+            labelIndexes[window.key] = index
+        return index
+
+
+    def __positionBelow(self, node, maxDepth=None):
+        """
+        The child indexes leading from this node down to the given one, or None
+        if it is not a descendant within maxDepth levels. Positions compare in
+        depth-first order.
+        """
+
+        position = []
+        try:
+            while node is not None and node != self:
+                if maxDepth is not None and len(position) >= maxDepth:
+                    return None
+                position.insert(0, node.indexInParent)
+                node = node.parent
+        except (GLib.GError, LookupError):
+            return None
+
+        if node is None or not position:
+            return None
+        return position
+
+
+    def __depthBelow(self, node, maxDepth=None):
+        """
+        How many levels below this node the given node is (1 for a child), or
+        None if it is not a descendant within maxDepth levels.
+        """
+
+        depth = 1
+        ancestor = node.parent
+        while ancestor is not None and (maxDepth is None or depth <= maxDepth):
+            if ancestor == self:
+                return depth
+            ancestor = ancestor.parent
+            depth += 1
+
+        return None
+
+
+    def __retrySearch(self, attempt, found, retry, describe, waitForResult=None):
+        """
+        The retrying shared by findChild and findMany: makes attempt() until
+        found() is true of its result, returning the last result. Without
+        retry, only one attempt is made. With config.searchWaitMode "poll",
+        up to config.searchCutoffCount attempts are made
+        config.searchBackoffDuration seconds apart. With "events",
+        waitForResult() is called to wait for the result if given; otherwise
+        the attempt is made again whenever AT-SPI events that can make a node
+        match arrive. Either way, waiting gives up after
+        config.searchCutoffCount * config.searchBackoffDuration seconds.
+        describe() says what is searched for in the log.
+        """
+
+        if retry and config.searchWaitMode == "events":
+            if config.debugSearching:
+                logger.log(str("Searching for %s (waiting for events)") % describe())
+
+            if waitForResult is not None:
+                return waitForResult()
+
+            events = []
+            deadline = time() + config.searchCutoffCount * config.searchBackoffDuration
+            # Listen before the first attempt, so that nothing changing in between is missed.
+            with EventWatcher(events.append, *searchEventTypes):
+                with holdCache():
+                    result = attempt()
+                while not found(result) and time() < deadline:
+                    if not pumpEvents(deadline - time(), until=lambda: len(events) > 0):
+                        break
+                    del events[:]
+                    with holdCache():
+                        result = attempt()
+            return result
+
+        result = None
+        number_of_attempts = 0
+        while number_of_attempts < config.searchCutoffCount:
+            if number_of_attempts >= config.searchWarningThreshold or config.debugSearching:
+                logger.log(str("Searching for %s (attempt %i)") % (describe(), number_of_attempts))
+
+            with holdCache():
+                result = attempt()
+
+            if found(result) or not retry:
+                break
+
+            number_of_attempts += 1
+            if config.debugSearching or config.debugSleep:
+                logger.log("sleeping for '%f'" % config.searchBackoffDuration)
+            sleep(config.searchBackoffDuration)
 
+        return result
 
-    def findChild(self, pred, recursive=True, debugName=None, retry=True, requireResult=True, showingOnly=None):
+
+    def findChild(self, pred, recursive=True, debugName=None, retry=True, requireResult=True, showingOnly=None,
+                  order=None, maxDepth=None):
         """
         Search for a node satisyfing the predicate, returning a Node.
 
+        Recursive searches visit the tree depth-first (order="dfs") or
+        breadth-first (order="bfs"), config.searchOrder by default. Breadth-first
+        returns the shallowest match. maxDepth limits how many levels below this
+        node are searched.
+
         If retry is True (the default), it makes multiple attempts, backing off and retrying
         on failure, and eventually raises a descriptive exception if the search fails.
 
@@ -1324,8 +2629,8 @@ class Node(object):
         attempts have failed. If it is false, the function simply returns None.
         """
 
-        debug_log("findChild(self, pred=%s, recursive=%s, debugName=%s, retry=%s, requireResult=%s, showingOnly=%s)" %
-                      (str(pred), str(recursive), str(debugName), str(retry), str(requireResult), str(showingOnly)))
+        debug_log("findChild(self, pred=%s, recursive=%s, debugName=%s, retry=%s, requireResult=%s, showingOnly=%s, order=%s, maxDepth=%s)" %
+                      (str(pred), str(recursive), str(debugName), str(retry), str(requireResult), str(showingOnly), str(order), str(maxDepth)))
 
         def describeSearch(parent, pred, recursive, debugName):
             """
@@ -1340,54 +2645,130 @@ class Node(object):
             return "%s of %s: %s" % (str(noun), parent.getLogString(), str(debugName))
 
 
-        compare_function = None
-        if isinstance(pred, LambdaType):
-            compare_function = pred
-            if debugName is None:
-                debugName = "child satisyfing a custom lambda function"
+        compare_function = None
+        if isinstance(pred, LambdaType):
+            compare_function = pred
+            if debugName is None:
+                debugName = "child satisyfing a custom lambda function"
+
+        else:
+            assert isinstance(pred, predicate.Predicate)
+            compare_function = pred.satisfiedByNode
+
+        result = self.__retrySearch(
+            lambda: self._fastFindChild(pred, recursive, showingOnly=showingOnly, order=order, maxDepth=maxDepth),
+            lambda result: result is not None, retry, lambda: describeSearch(self, pred, recursive, debugName),
+            waitForResult=lambda: self._waitForChild(pred, recursive, showingOnly=showingOnly, order=order,
+                                                     maxDepth=maxDepth))
+
+        if result:
+            assert isinstance(result, Node)
+            if debugName:
+                result.debugName = debugName
+            else:
+                result.debugName = pred.describeSearchResult()
+            return result
+
+        if requireResult:
+            raise SearchError(describeSearch(self, pred, recursive, debugName))
+
+
+    def findMany(self, targets, recursive=True, retry=True, requireResult=True, showingOnly=None,
+                 order=None, maxDepth=None):
+        """
+        Search for several nodes in a single walk of the tree, returning a
+        dictionary of the first node satisfying each of them. targets is a
+        dictionary of names to predicates (Predicates or functions, as for
+        findChild), e.g. {"ok": IsAButtonNamed("OK"), "name": IsLabelledAs("Name")}.
+        The walk stops as soon as every target has been found.
+
+        Retrying works as for findChild, each attempt only searching for the
+        targets still missing. If requireResult is True (the default) and some
+        targets are never found, SearchError is raised listing them; otherwise
+        they map to None.
+        """
+
+        debug_log("findMany(self, targets=%s, recursive=%s, retry=%s, requireResult=%s, showingOnly=%s, order=%s, maxDepth=%s)" %
+                      (str(targets), str(recursive), str(retry), str(requireResult), str(showingOnly), str(order), str(maxDepth)))
+
+        def describeTarget(name):
+            pred = targets[name]
+            if isinstance(pred, predicate.Predicate):
+                return "%s (%s)" % (str(name), pred.describeSearchResult())
+            return str(name)
+
+        if showingOnly is None:
+            showingOnly = config.searchShowingOnly
+        if order is None:
+            order = config.searchOrder
+        if not recursive:
+            maxDepth = 1
+
+        results = {}
+
+        def describeMissing():
+            return "%s of %s: %s" % ("descendants" if recursive else "children", self.getLogString(),
+                                     ", ".join(describeTarget(name) for name in targets if name not in results))
+
+        def attempt():
+            missing = [name for name in targets if name not in results]
+            results.update(self.__findMany(dict((name, targets[name]) for name in missing),
+                                           showingOnly, order, maxDepth))
+            return results
+
+        self.__retrySearch(attempt, lambda results: len(results) == len(targets), retry, describeMissing)
+
+        for name, node in results.items():
+            pred = targets[name]
+            node.debugName = pred.describeSearchResult() if isinstance(pred, predicate.Predicate) else str(name)
 
-        else:
-            assert isinstance(pred, predicate.Predicate)
-            compare_function = pred.satisfiedByNode
+        if len(results) < len(targets) and requireResult:
+            raise SearchError(describeMissing())
+        return dict((name, results.get(name)) for name in targets)
 
-        number_of_attempts = 0
-        while number_of_attempts < config.searchCutoffCount:
-            if number_of_attempts >= config.searchWarningThreshold or config.debugSearching:
-                logger.log(str("Searching for %s (attempt %i)") %
-                           (describeSearch(self, pred, recursive, debugName), number_of_attempts))
 
-            result = self._fastFindChild(compare_function, recursive, showingOnly=showingOnly)
+    def __findMany(self, targets, showingOnly, order, maxDepth):
+        """
+        One walk of findMany, returning the targets found.
+        """
 
-            if result:
-                assert isinstance(result, Node)
-                if debugName:
-                    result.debugName = debugName
-                else:
-                    result.debugName = pred.describeSearchResult()
-                return result
+        pending = dict(targets)
+        functions = dict((name, pred.satisfiedByNode if isinstance(pred, predicate.Predicate) else pred)
+                         for name, pred in targets.items())
 
-            else:
-                if not retry:
-                    break
-                number_of_attempts += 1
-                if config.debugSearching or config.debugSleep:
-                    logger.log("sleeping for '%f'" % config.searchBackoffDuration)
-                sleep(config.searchBackoffDuration)
+        def prune(node):
+            # Only cut a subtree off if none of the pending targets can be in it
+            if showingOnly and not node.showing and node.role != pyatspi.ROLE_APPLICATION:
+                return True
+            return all(isinstance(pred, predicate.Predicate) and predicate.prunesSubtrees(pred) and pred.prunes(node)
+                       for pred in pending.values())
 
-        if requireResult:
-            raise SearchError(describeSearch(self, pred, recursive, debugName))
+        found = {}
+        for node in self._walk(order, maxDepth, prune):
+            if showingOnly and not satisfiesQuietly(lambda x: x.showing, node):
+                continue
+            for name in list(pending):
+                if satisfiesQuietly(functions[name], node):
+                    found[name] = node
+                    del pending[name]
+            if not pending:
+                break
+        return found
 
 
-    def findChildren(self, pred, recursive=True, isLambda=False, showingOnly=None):
+    def findChildren(self, pred, recursive=True, isLambda=False, showingOnly=None, order=None, maxDepth=None):
         """
         Find all children/descendents satisfying the predicate. You can also use lambdas in
         place of the pred that will enable search also against pure dogtail Node properties
         (like showing). I.e: "lambda x: x.roleName == 'menu item' and x.showing is True".
         isLambda does not have to be set, it's kept only for api compatibility.
+
+        The results come in depth-first or breadth-first order (order="dfs"/"bfs",
+        config.searchOrder by default), from at most maxDepth levels below this node.
         """
 
-        debug_log("findChildren(self, pred=%s, recursive=%s, isLambda=%s, showingOnly=%s)" %
-                      (str(pred), str(recursive), str(isLambda), str(showingOnly)))
+        debug_log("findChildren(self, pred=%s, recursive=%s, isLambda=%s, showingOnly=%s, order=%s, maxDepth=%s)" %
+                      (str(pred), str(recursive), str(isLambda), str(showingOnly), str(order), str(maxDepth)))
 
         compare_function = None
         if isLambda is True or isinstance(pred, LambdaType):
@@ -1399,11 +2780,12 @@ class Node(object):
 
         if showingOnly is None:
             showingOnly = config.searchShowingOnly
+        if order is None:
+            order = config.searchOrder
 
+        match_function = compare_function
         if showingOnly:
-            original_compare_func = compare_function
-            compare_function = lambda n: original_compare_func(n) and \
-                n.getState().contains(pyatspi.STATE_SHOWING)
+            compare_function = lambda n: match_function(n) and n.showing
 
         results = []
         number_of_attempts = 0
@@ -1412,10 +2794,24 @@ class Node(object):
                 logger.log("Warning: a11y errors caught, making attempt %i" % number_of_attempts)
 
             try:
-                if recursive:
-                    results = pyatspi.utils.findAllDescendants(self, compare_function)
-                else:
-                    results = list(filter(compare_function, self.children))
+                with holdCache():
+                    candidates = None
+                    if recursive:
+                        candidates = self._collectionMatches(pred, showingOnly=showingOnly)
+
+                    if candidates is not None:
+                        results = [node for node in candidates if satisfiesQuietly(match_function, node)]
+                        if order == "bfs" or maxDepth is not None:
+                            # The application matches in depth-first order.
+                            ranked = [(self.__depthBelow(node, maxDepth), i, node) for i, node in enumerate(results)]
+                            ranked = [entry for entry in ranked if entry[0] is not None]
+                            if order == "bfs":
+                                ranked.sort(key=lambda entry: entry[:2])
+                            results = [node for (_, _, node) in ranked]
+                    elif recursive:
+                        results = list(self.iterDescendants(pred, order, maxDepth, showingOnly))
+                    else:
+                        results = list(filter(compare_function, self.iterChildren()))
                 break
 
             except (GLib.GError, TypeError):
@@ -1430,6 +2826,48 @@ class Node(object):
         return results
 
 
+    def iterDescendants(self, pred=None, order=None, maxDepth=None, showingOnly=None):
+        """
+        Yields the descendants of this node satisfying the predicate (or all of
+        them, if it is None) as the walk finds them, depth-first or breadth-first
+        (order="dfs"/"bfs", config.searchOrder by default) and at most maxDepth
+        levels down. Like findChildren, it takes a Predicate or a function, but
+        neither retries nor collects anything: the caller can stop at any point,
+        and only the nodes of the levels being walked are held at a time.
+        """
+
+        debug_log("iterDescendants(self, pred=%s, order=%s, maxDepth=%s, showingOnly=%s)" %
+                      (str(pred), str(order), str(maxDepth), str(showingOnly)))
+
+        if showingOnly is None:
+            showingOnly = config.searchShowingOnly
+        if order is None:
+            order = config.searchOrder
+
+        match_function = pred
+        if isinstance(pred, predicate.Predicate):
+            match_function = pred.satisfiedByNode
+        elif pred is None:
+            match_function = lambda x: True
+
+        compare_function = match_function
+        if showingOnly:
+            compare_function = lambda x: match_function(x) and x.showing
+
+        view, onChildren = self.__searchView(pred, showingOnly)
+        prune = self.__searchPrune(pred, showingOnly, view)
+        # Hold the cache for each step of the walk, not while the caller has the node.
+        walk = self._walk(order, maxDepth, prune, onChildren)
+        while True:
+            with holdCache():
+                node = next(walk, None)
+                matched = node is not None and satisfiesQuietly(compare_function, view(node))
+            if node is None:
+                return
+            if matched:
+                yield node
+
+
     def findAncestor(self, pred, showingOnly=None):
         """
         Search up the ancestry of this node, returning the first Node
@@ -1451,22 +2889,25 @@ class Node(object):
         return None
 
     # Various wrapper/helper search methods:
-    def child(self, name="", roleName="", description="", label="", identifier="", recursive=True, retry=True, debugName=None, showingOnly=None):
+    def child(self, name="", roleName="", description="", label="", identifier="", recursive=True, retry=True, debugName=None, showingOnly=None,
+              order=None, maxDepth=None):
         """
         Finds a child satisying the given criteria.
 
         This is implemented using findChild, and hence will automatically retry
         if no such child is found, and will eventually raise an exception. It
-        also logs the search.
+        also logs the search. See findChild for order and maxDepth.
         """
 
-        debug_log("child(self, name=%s, roleName=%s, description=%s, label=%s, identifier=%s, recursive=%s, retry=%s, debugName=%s, showingOnly=%s)" %
-            (str(name), str(roleName), str(description), str(label), str(identifier), str(recursive), str(retry), str(debugName), str(showingOnly)))
+        debug_log("child(self, name=%s, roleName=%s, description=%s, label=%s, identifier=%s, recursive=%s, retry=%s, debugName=%s, showingOnly=%s, order=%s, maxDepth=%s)" %
+            (str(name), str(roleName), str(description), str(label), str(identifier), str(recursive), str(retry), str(debugName), str(showingOnly), str(order), str(maxDepth)))
 
         return self.findChild(predicate.GenericPredicate(name=name, roleName=roleName, description=description,
-                              label=label, identifier=identifier), recursive=recursive, retry=retry, debugName=debugName, showingOnly=showingOnly)
+                              label=label, identifier=identifier), recursive=recursive, retry=retry, debugName=debugName, showingOnly=showingOnly,
+                              order=order, maxDepth=maxDepth)
 
-    def isChild(self, name="", roleName="", description="", label="", identifier="", recursive=True, retry=False, debugName=None, showingOnly=None):
+    def isChild(self, name="", roleName="", description="", label="", identifier="", recursive=True, retry=False, debugName=None, showingOnly=None,
+                order=None, maxDepth=None):
         """
         Determines whether a child satisying the given criteria exists.
 
@@ -1477,19 +2918,37 @@ class Node(object):
         any other exceptions. It also logs the search.
         """
 
-        debug_log("isChild(self, name=%s, roleName=%s, description=%s, label=%s, identifier=%s, recursive=%s, retry=%s, debugName=%s, showingOnly=%s)" %
-            (str(name), str(roleName), str(description), str(label), str(identifier), str(recursive), str(retry), str(debugName), str(showingOnly)))
+        debug_log("isChild(self, name=%s, roleName=%s, description=%s, label=%s, identifier=%s, recursive=%s, retry=%s, debugName=%s, showingOnly=%s, order=%s, maxDepth=%s)" %
+            (str(name), str(roleName), str(description), str(label), str(identifier), str(recursive), str(retry), str(debugName), str(showingOnly), str(order), str(maxDepth)))
 
         try:
             self.findChild(
                 predicate.GenericPredicate(
                     name=name, roleName=roleName, description=description, label=label, identifier=identifier),
-                recursive=recursive, retry=retry, debugName=debugName, showingOnly=showingOnly)
+                recursive=recursive, retry=retry, debugName=debugName, showingOnly=showingOnly,
+                order=order, maxDepth=maxDepth)
             return True
         except SearchError:
             return False
 
 
+    def locate(self, name="", roleName="", description="", label="", identifier="", recursive=True, debugName=None,
+               showingOnly=None, order=None, maxDepth=None):
+        """
+        Get a Locator for a child satisfying the given criteria, as child()
+        would find it. The search is only made when the Locator is first used,
+        and made again only once the node it found has gone away, so keeping
+        Locators around saves searching for the same widget over and over.
+        """
+
+        debug_log("locate(self, name=%s, roleName=%s, description=%s, label=%s, identifier=%s, recursive=%s, debugName=%s, showingOnly=%s, order=%s, maxDepth=%s)" %
+            (str(name), str(roleName), str(description), str(label), str(identifier), str(recursive), str(debugName), str(showingOnly), str(order), str(maxDepth)))
+
+        return Locator(self, predicate.GenericPredicate(name=name, roleName=roleName, description=description,
+                       label=label, identifier=identifier), recursive=recursive, debugName=debugName,
+                       showingOnly=showingOnly, order=order, maxDepth=maxDepth)
+
+
     def menu(self, menuName, recursive=True, showingOnly=None):
         """
         Search below this node for a menu with the given name.
@@ -1605,19 +3064,15 @@ class Node(object):
         debug_log("getUserVisibleStrings(self)")
 
         result = []
-        if self.name:
-            result.append(self.name)
-
-        if self.description:
-            result.append(self.description)
-
-        try:
-            children = self.children
-        except Exception:
-            return result
+        for node in chain((self,), self.iterDescendants(showingOnly=False)):
+            try:
+                if node.name:
+                    result.append(node.name)
 
-        for child in children:
-            result.extend(child.getUserVisibleStrings())
+                if node.description:
+                    result.append(node.description)
+            except Exception:
+                continue
 
         return result
 
@@ -1660,6 +3115,579 @@ class LinkAnchor(object):
         return self.link.getURI(self.anchorIndex)
 
 
+class Locator(object):
+    """
+    Lazy handle on a node found by searching below a parent node or Locator,
+    see Node.locate(). The node is searched for when the Locator is first
+    used and kept; before each later use, a single call checks that it is
+    still in the tree, and only if it isn't the search is made again.
+
+    Attributes and methods not defined here are those of the node, so
+    actions can be performed on a Locator just like on a Node:
+
+        menu = gedit.locate("Menu", "toggle button")
+        menu.click()
+        menu.click()
+    """
+
+    __slots__ = ("_root", "_pred", "_recursive", "_debugName", "_showingOnly", "_order", "_maxDepth", "_node")
+
+    def __init__(self, parent, pred, recursive=True, debugName=None, showingOnly=None, order=None, maxDepth=None):
+        for attribute, value in (("_root", parent), ("_pred", pred), ("_recursive", recursive),
+                                 ("_debugName", debugName), ("_showingOnly", showingOnly),
+                                 ("_order", order), ("_maxDepth", maxDepth), ("_node", None)):
+            object.__setattr__(self, attribute, value)
+
+
+    def __getattr__(self, name):
+        if name in Locator.__slots__:
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+
+    def __setattr__(self, name, value):
+        if name in Locator.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.resolve(), name, value)
+
+
+    def __str__(self):
+        return str("<Locator of %s below %s>") % (self._pred.describeSearchResult(), str(self._root))
+
+
+    def __repr__(self):
+        return str(self)
+
+
+    def __len__(self):
+        return len(self.resolve())
+
+
+    def __getitem__(self, index):
+        return self.resolve()[index]
+
+
+    def __iter__(self):
+        return iter(self.resolve())
+
+
+    def __isAlive(self, node):
+        """
+        Is the node still in the tree? Costs a single call.
+        """
+
+        try:
+            return node.indexInParent >= 0 or node.parent is None
+        except Exception:
+            return False
+
+
+    def resolve(self):
+        """
+        Get the node, searching for it if it hasn't been found yet or the one
+        found before has gone away. Raises SearchError like Node.findChild.
+        """
+
+        debug_log("Locator.resolve(self=%s)" % str(self))
+
+        node = self._node
+        if node is not None and self.__isAlive(node):
+            return node
+
+        root = self._root.resolve() if isinstance(self._root, Locator) else self._root
+        node = root.findChild(self._pred, recursive=self._recursive, debugName=self._debugName,
+                              showingOnly=self._showingOnly, order=self._order, maxDepth=self._maxDepth)
+        self._node = node
+        return node
+
+
+    def locate(self, name="", roleName="", description="", label="", identifier="", recursive=True, debugName=None,
+               showingOnly=None, order=None, maxDepth=None):
+        """
+        Get a Locator for a child of the node this one finds, see Node.locate().
+        """
+
+        debug_log("Locator.locate(self, name=%s, roleName=%s, description=%s, label=%s, identifier=%s, recursive=%s)" %
+            (str(name), str(roleName), str(description), str(label), str(identifier), str(recursive)))
+
+        return Locator(self, predicate.GenericPredicate(name=name, roleName=roleName, description=description,
+                       label=label, identifier=identifier), recursive=recursive, debugName=debugName,
+                       showingOnly=showingOnly, order=order, maxDepth=maxDepth)
+
+
+def prefetchAll(nodes, properties=("name", "role", "description", "childCount")):
+    """
+    Node.prefetch() for several nodes at once: all the calls for all the nodes
+    are in flight at the same time. Returns the PrefetchedNodes in the same
+    order as the nodes. Nodes that went away come back with nothing prefetched.
+    """
+
+    debug_log("prefetchAll(nodes=%i, properties=%s)" % (len(nodes), str(properties)))
+
+    plans = []
+    calls = []
+    for node in nodes:
+        try:
+            role, generation, nodeCalls = node._prefetchCalls(properties)
+        except (GLib.GError, LookupError):
+            role, generation, nodeCalls = None, None, {}
+        methods = list(nodeCalls)
+        plans.append((node, role, generation, methods, len(calls)))
+        calls.extend(nodeCalls[method] for method in methods)
+
+    replies = callAccessibilityBus(calls)
+
+    return [node._prefetched(properties, role, generation,
+                             dict(zip(methods, replies[first:first + len(methods)])))
+            for (node, role, generation, methods, first) in plans]
+
+
+def statesToStateSet(bitfield):
+    """
+    Turn the state bitfield of an AT-SPI reply into an Atspi.StateSet.
+    """
+
+    return stateSetFromStates(statesFromBitfield(bitfield))
+
+
+def stateSetFromStates(states):
+    """
+    Turn states (as integers) into an Atspi.StateSet, like Node.getState()
+    returns.
+    """
+
+    stateTypes = []
+    for state in states:
+        try:
+            stateTypes.append(pyatspi.Atspi.StateType(state))
+        except ValueError:
+            pass
+    return pyatspi.Atspi.StateSet.new(stateTypes)
+
+
+class PrefetchedNode(object):
+    """
+    View of a node with some of its properties fetched in one go by
+    Node.prefetch(), for evaluating predicates without a round trip for every
+    property they read. Anything that wasn't prefetched comes from the node.
+    """
+
+    # property -> (D-Bus method, its argument, conversion of the reply)
+    accessibleProperties = GLib.Variant("(s)", ("org.a11y.atspi.Accessible",))
+    sources = {
+        "name": ("GetAll", accessibleProperties, lambda reply: reply["Name"]),
+        "description": ("GetAll", accessibleProperties, lambda reply: reply["Description"]),
+        "childCount": ("GetAll", accessibleProperties, lambda reply: reply["ChildCount"]),
+        "accessibleId": ("GetAll", accessibleProperties, lambda reply: reply["AccessibleId"]),
+        "role": ("GetRole", None, lambda role: pyatspi.Atspi.Role(role)),
+        "roleName": ("GetRole", None, lambda role: getRoleName(pyatspi.Atspi.Role(role))),
+        "states": ("GetState", None, statesToStateSet),
+        "attributes": ("GetAttributes", None, dict),
+    }
+
+    stateProperties = {
+        "sensitive": pyatspi.STATE_SENSITIVE,
+        "showing": pyatspi.STATE_SHOWING,
+        "focusable": pyatspi.STATE_FOCUSABLE,
+        "focused": pyatspi.STATE_FOCUSED,
+        "checked": pyatspi.STATE_CHECKED,
+    }
+
+    def __init__(self, node, values):
+        self.node = node
+        self.values = values
+        if "role" in values and "roleName" not in values:
+            values["roleName"] = getRoleName(values["role"])
+
+
+    def __getattr__(self, name):
+        values = self.__dict__.get("values", {})
+        if name in values:
+            return values[name]
+        if name in PrefetchedNode.stateProperties and "states" in values:
+            return values["states"].contains(PrefetchedNode.stateProperties[name])
+        return getattr(self.__dict__["node"], name)
+
+
+    def __dir__(self):
+        return sorted(set(dir(self.node)) | set(self.values))
+
+
+    def __eq__(self, other):
+        return self.node == getattr(other, "node", other)
+
+
+    def __ne__(self, other):
+        return not self == other
+
+
+    def __hash__(self):
+        return hash(self.node)
+
+
+    def __str__(self):
+        return str(self.node)
+
+
+    def getState(self):
+        if "states" in self.values:
+            return self.values["states"]
+        return self.node.stateSet
+
+
+    def get_attributes(self):
+        if "attributes" in self.values:
+            return self.values["attributes"]
+        return self.node.get_attributes()
+
+
+class ApplicationIndex(object):
+    """
+    Index of the nodes of an application by name, by role name and name, and by
+    accessible id, kept current from the AT-SPI children-changed and name change
+    events. Use Application.index() to get one.
+
+    Entries are candidates rather than answers: events can be missed (e.g. for
+    rows of containers managing their descendants) and a removed subtree is
+    only dropped as far as its root, so whoever uses an entry has to check the
+    node still satisfies the search.
+    """
+
+    def __init__(self, application):
+        debug_log("ApplicationIndex(application=%s)" % str(application))
+
+        self.application = application
+        self.busName = application.busName
+        self.entries = {}
+        self.keysOf = {}
+        self.watcher = EventWatcher(self.__onEvent,
+                                    "object:children-changed",
+                                    "object:property-change:accessible-name")
+        self.watcher.register()
+        self.rebuild()
+
+
+    def rebuild(self):
+        """
+        Forget everything and index the whole application again.
+        """
+
+        debug_log("ApplicationIndex.rebuild(self)")
+
+        self.entries = {}
+        self.keysOf = {}
+        for node in self.application._walk():
+            self.__add(node)
+
+
+    def close(self):
+        """
+        Stop keeping the index current, and stop searches from using it.
+        """
+
+        debug_log("ApplicationIndex.close(self)")
+
+        self.watcher.deregister()
+        self.entries = {}
+        self.keysOf = {}
+        if applicationIndexes.get(self.busName) is self:
+            del applicationIndexes[self.busName]
+
+
+    def lookup(self, name=None, roleName=None, identifier=None):
+        """
+        Nodes indexed with the given accessible id, or else with the given name
+        (and role name, if given). Nodes that went away are dropped.
+        """
+
+        pumpEvents()
+
+        if identifier is not None:
+            key = ("id", identifier)
+        elif name is None:
+            raise ValueError("Either a name or an identifier is needed")
+        elif roleName is not None:
+            key = ("role", roleName, name)
+        else:
+            key = ("name", name)
+
+        nodes = []
+        for node in list(self.entries.get(key, [])):
+            keys = self.keysOf.get(node, [])
+            if identifier is not None:
+                if name is not None and ("name", name) not in keys:
+                    continue
+                if roleName is not None and not any(k[0] == "role" and k[1] == roleName for k in keys):
+                    continue
+            try:
+                if node.indexInParent >= 0:
+                    nodes.append(node)
+                    continue
+            except (GLib.GError, LookupError):
+                pass
+            self.__remove(node)
+        return nodes
+
+
+    def __add(self, node):
+        try:
+            name = node.name
+            keys = [("name", name), ("role", node.roleName, name)]
+            for identifier in (node.get_attributes().get("id"), getattr(node, "accessibleId", None)):
+                if identifier and ("id", identifier) not in keys:
+                    keys.append(("id", identifier))
+        except (GLib.GError, LookupError):
+            return
+
+        self.__remove(node)
+        self.keysOf[node] = keys
+        for key in keys:
+            self.entries.setdefault(key, []).append(node)
+
+
+    def __remove(self, node):
+        for key in self.keysOf.pop(node, []):
+            nodes = self.entries.get(key, [])
+            if node in nodes:
+                nodes.remove(node)
+            if not nodes:
+                self.entries.pop(key, None)
+
+
+    def __onEvent(self, event):
+        try:
+            if not event.source or event.source.busName != self.busName:
+                return
+
+            if event.type.startswith("object:children-changed:add"):
+                if event.any_data:
+                    self.__add(event.any_data)
+                    for node in event.any_data._walk():
+                        self.__add(node)
+
+            elif event.type.startswith("object:children-changed:remove"):
+                if event.any_data:
+                    self.__remove(event.any_data)
+
+            else:
+                self.__add(event.source)
+
+        except (GLib.GError, LookupError):
+            debug_log("Node from the event went away before it could be indexed.")
+
+
+def watchLabelIndexes():
+    """
+    Listen to the events that keep the label indexes current, with a single
+    listener for all of them (see dispatchLabelEvent).
+    """
+
+    global labelIndexWatcher
+    if labelIndexWatcher is None:
+        labelIndexWatcher = EventWatcher(dispatchLabelEvent, "object:children-changed",
+                                         "object:property-change:accessible-name",
+                                         "object:state-changed:defunct")
+        labelIndexWatcher.register()
+
+
+def unwatchLabelIndexes():
+    global labelIndexWatcher
+    if labelIndexWatcher is not None:
+        labelIndexWatcher.deregister()
+        labelIndexWatcher = None
+    labelIndexOwners.clear()
+
+
+def labelIndexWindowKey(node):
+    """
+    The key of the window with a label index that the node is in, or None.
+    The answer is remembered for every node on the way up, so that later
+    events from the same part of the tree are dispatched without going up it
+    again.
+    """
+
+    keys = []
+    windowKey = None
+    while node is not None:
+        key = node.key
+        if key in labelIndexes:
+            windowKey = key
+            break
+        if key in labelIndexOwners:
+            windowKey = labelIndexOwners[key]
+            break
+        if node.role == pyatspi.ROLE_APPLICATION:
+            break
+        keys.append(key)
+        node = node.parent
+    for key in keys:
+        labelIndexOwners[key] = windowKey
+    return windowKey
+
+
+def dispatchLabelEvent(event):
+    """
+    Hand an event to the label index of the window it comes from. Indexed
+    windows that are removed from their application or go defunct have their
+    index closed.
+    """
+
+    try:
+        source = event.source
+        if not source or source.busName not in set(index.busName for index in labelIndexes.values()):
+            return
+
+        if event.type.startswith("object:state-changed:defunct"):
+            index = labelIndexes.get(source.key)
+            if index is not None and event.detail1:
+                index.close()
+            return
+
+        if event.type.startswith("object:children-changed:remove") and event.any_data:
+            removedKey = event.any_data.key
+            labelIndexOwners.pop(removedKey, None)
+            if removedKey in labelIndexes:
+                labelIndexes[removedKey].close()
+                return
+
+        index = labelIndexes.get(labelIndexWindowKey(source))
+        if index is not None:
+            index.update(event)
+
+    except (GLib.GError, LookupError):
+        debug_log("Node from the event went away before it could be indexed.")
+
+
+class LabelIndex(object):
+    """
+    Index of the nodes that the labels of a window are labels for, by label
+    text. It is built from the LABEL_FOR relations of all the window's labels,
+    which are fetched with a single Collection call where possible, and kept
+    current from the AT-SPI children-changed and name change events, which a
+    single listener dispatches to the index of the window they come from. The
+    index is closed when its window goes away. Use Node.labelIndex() to get
+    one.
+
+    As with ApplicationIndex, entries are candidates rather than answers, to
+    be checked against the search.
+    """
+
+    def __init__(self, window):
+        debug_log("LabelIndex(window=%s)" % str(window))
+
+        self.window = window
+        self.key = window.key
+        self.busName = window.busName
+        self.entries = {}
+        self.labels = {}
+        watchLabelIndexes()
+        # Nodes remembered as outside of any indexed window may be in this one.
+        for key in [key for (key, windowKey) in labelIndexOwners.items() if windowKey is None]:
+            del labelIndexOwners[key]
+        self.rebuild()
+
+
+    def rebuild(self):
+        """
+        Forget everything and read the window's labels again.
+        """
+
+        debug_log("LabelIndex.rebuild(self)")
+
+        self.entries = {}
+        self.labels = {}
+        for label in self.__labelsBelow(self.window):
+            self.__add(label)
+
+
+    def close(self):
+        """
+        Stop keeping the index current, and stop searches from using it.
+        """
+
+        debug_log("LabelIndex.close(self)")
+
+        self.entries = {}
+        self.labels = {}
+        if labelIndexes.get(self.key) is self:
+            del labelIndexes[self.key]
+        for key in [key for (key, windowKey) in labelIndexOwners.items() if windowKey == self.key]:
+            del labelIndexOwners[key]
+        if not labelIndexes:
+            unwatchLabelIndexes()
+
+
+    def lookup(self, text):
+        """
+        Nodes labelled by a label with the given text. If the window went away,
+        the index is closed and nothing is found.
+        """
+
+        pumpEvents()
+
+        if labelIndexes.get(self.key) is not self:
+            return []
+
+        nodes = []
+        for label in self.entries.get(text, []):
+            for node in self.labels[label][1]:
+                if node is not None and node not in nodes:
+                    nodes.append(node)
+        return nodes
+
+
+    def update(self, event):
+        """
+        Bring the index up to date with an event from its window.
+        """
+
+        if event.type.startswith("object:children-changed:add"):
+            if event.any_data:
+                for label in [event.any_data] + self.__labelsBelow(event.any_data):
+                    if satisfiesQuietly(lambda x: x.roleName == "label", label):
+                        self.__add(label)
+
+        elif event.type.startswith("object:children-changed:remove"):
+            if event.any_data:
+                self.__remove(event.any_data)
+
+        elif event.source.roleName == "label":
+            self.__add(event.source)
+
+
+    def __labelsBelow(self, node):
+        labels = node._collectionMatches(predicate.GenericPredicate(roleName="label"), showingOnly=False)
+        if labels is None:
+            labels = node._walk()
+        return [label for label in labels if satisfiesQuietly(lambda x: x.roleName == "label", label)]
+
+
+    def __add(self, label):
+        try:
+            text = label.name
+            targets = label.labellee
+        except (GLib.GError, LookupError):
+            return
+
+        self.__remove(label)
+        if targets is None:
+            return
+        if not isinstance(targets, list):
+            targets = [targets]
+        self.labels[label] = (text, targets)
+        self.entries.setdefault(text, []).append(label)
+
+
+    def __remove(self, label):
+        text, _ = self.labels.pop(label, (None, None))
+        labels = self.entries.get(text, [])
+        if label in labels:
+            labels.remove(label)
+        if not labels:
+            self.entries.pop(text, None)
+
+
 class Root(Node):
     """
     Root class used to get data from Accessible.
@@ -1728,6 +3756,25 @@ class Application(Node):
         return result
 
 
+    def index(self):
+        """
+        Get the index of this application's nodes by name, role name and
+        accessible id, making it on the first call (which walks the whole
+        application once). From then on, findChild and the helpers using it
+        (child, button, menuItem...) look nodes with literal names up in the
+        index first, and only walk the tree when that finds nothing.
+        See ApplicationIndex.
+        """
+
+        debug_log("index(self)")
+
+        index = applicationIndexes.get(self.busName)
+        if index is None:
+            index = ApplicationIndex(self)
+            applicationIndexes[self.busName] = index
+        return index
+
+
     def getWnckApplication(self, showingOnly=None):  # pragma: no cover
         """
         Get the wnck.Application instance for this application, or None
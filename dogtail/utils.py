@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
-from time import sleep
+from time import sleep, time
 import os
 import sys
 import errno
@@ -17,7 +17,7 @@ from dogtail.logging import TimeStamp
 import gi
 gi.require_version("Gtk", "3.0")
 gi.require_version("Gdk", "3.0")
-from gi.repository import Gtk, GLib
+from gi.repository import Gtk, Gdk, GLib
 
 """
 Various utilities
@@ -160,6 +160,225 @@ def doDelay(delay=None):
     sleep(delay)
 
 
+def pumpEvents(timeout=0, until=None):
+    """
+    Dispatch pending AT-SPI events. AT-SPI delivers events through the GLib
+    main context and dogtail does not run a main loop of its own, so event
+    listeners only get called while something iterates the context.
+
+    With a timeout, keep dispatching for up to that many seconds, returning
+    as soon as the optional 'until' callable returns True. Returns the last
+    result of 'until' (False if it was never satisfied or not given).
+    """
+
+    context = GLib.MainContext.default()
+    deadline = time() + timeout
+
+    while True:
+        while context.pending():
+            context.iteration(False)
+
+        if until is not None and until():
+            return True
+
+        remaining = deadline - time()
+        if remaining <= 0:
+            return False
+
+        # Block until the next event arrives or the deadline passes.
+        expired = []
+        def wakeUp():
+            expired.append(True)
+            return False
+
+        source_id = GLib.timeout_add(max(1, int(remaining * 1000)), wakeUp)
+        context.iteration(True)
+        if not expired:
+            GLib.source_remove(source_id)
+
+
+class EventWatcher(object):
+    """
+    Passes AT-SPI events of the given types to the callback for as long as it
+    is registered. Can be used as a context manager. The events are only
+    delivered while pumpEvents() runs.
+    """
+
+    def __init__(self, callback, *eventTypes):
+        self.callback = callback
+        self.eventTypes = eventTypes
+        self.registered = False
+
+
+    def register(self):
+        """
+        Start listening for the events.
+        """
+
+        debug_log("EventWatcher.register(self) - %s" % ", ".join(self.eventTypes))
+
+        if not self.registered:
+            import pyatspi
+            pyatspi.Registry.registerEventListener(self.callback, *self.eventTypes)
+            self.registered = True
+
+
+    def deregister(self):
+        """
+        Stop listening for the events.
+        """
+
+        debug_log("EventWatcher.deregister(self) - %s" % ", ".join(self.eventTypes))
+
+        if self.registered:
+            import pyatspi
+            pyatspi.Registry.deregisterEventListener(self.callback, *self.eventTypes)
+            self.registered = False
+
+
+    def __enter__(self):
+        self.register()
+        return self
+
+
+    def __exit__(self, *args):
+        self.deregister()
+
+
+lastEventTimes = {}
+
+
+def watchActivity():
+    """
+    An EventWatcher recording when AT-SPI events last arrived, both overall
+    and for each application (by bus name), so that waitForIdle() can tell
+    when the UI has settled down. Listening to every event makes every
+    application emit them all, so it is only registered while waiting.
+    """
+
+    return EventWatcher(noteActivity, "object:", "window:", "focus:", "document:")
+
+
+def noteActivity(event):
+    now = time()
+    lastEventTimes[None] = now
+    try:
+        lastEventTimes[event.source.busName] = now
+    except Exception:
+        pass
+
+
+def waitForIdle(quietPeriod=0.05, timeout=None, busName=None):
+    """
+    Dispatch AT-SPI events until none have arrived for quietPeriod seconds,
+    from the application with the given bus name or, if None, from any
+    application. Gives up after timeout seconds (config.actionDelay by
+    default). Returns True if the UI went quiet, False on timeout.
+    """
+
+    debug_log("waitForIdle(quietPeriod=%s, timeout=%s, busName=%s)" % (quietPeriod, timeout, busName))
+
+    if timeout is None:
+        timeout = config.actionDelay
+
+    start = time()
+    deadline = start + timeout
+    with watchActivity():
+        while True:
+            pumpEvents()
+            last = max(start, lastEventTimes.get(busName, start))
+            now = time()
+            if now - last >= quietPeriod:
+                return True
+            if now >= deadline:
+                if config.debugSleep:
+                    logger.log("Gave up waiting for idle after %f seconds" % timeout)
+                return False
+            pumpEvents(min(last + quietPeriod, deadline) - now,
+                       until=lambda: lastEventTimes.get(busName, start) > last)
+
+
+def doSyncDelay(delay=None, busName=None):
+    """
+    Wait for the application to catch up after an action: sleep for the delay
+    with config.syncMode "delay", or with "events" wait at most that long
+    for the UI to go idle (see waitForIdle).
+    """
+
+    if delay is None:
+        delay = config.defaultDelay
+
+    if config.syncMode == "events":
+        waitForIdle(timeout=delay, busName=busName)
+    else:
+        doDelay(delay)
+
+
+accessibilityBus = None
+
+
+def getAccessibilityBus():
+    """
+    Get a Gio.DBusConnection to the accessibility bus, for the few AT-SPI calls
+    the bindings don't expose. The connection is opened once and reused.
+    """
+
+    global accessibilityBus
+    if accessibilityBus is None:
+        debug_log("getAccessibilityBus() - connecting")
+
+        from gi.repository import Gio
+        address = os.environ.get("AT_SPI_BUS_ADDRESS")
+        if not address:
+            sessionBus = Gio.bus_get_sync(Gio.BusType.SESSION, None)
+            reply = sessionBus.call_sync("org.a11y.Bus", "/org/a11y/bus", "org.a11y.Bus",
+                                         "GetAddress", None, GLib.VariantType.new("(s)"),
+                                         Gio.DBusCallFlags.NONE, -1, None)
+            address = reply.unpack()[0]
+        accessibilityBus = Gio.DBusConnection.new_for_address_sync(
+            address,
+            Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT |
+            Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION,
+            None, None)
+    return accessibilityBus
+
+
+def callAccessibilityBus(calls):
+    """
+    Make D-Bus calls on the accessibility bus, all in flight at the same time,
+    and return their replies in the same order (None for the ones that
+    failed). calls is a list of (bus name, object path, interface, method,
+    arguments) tuples. Each call gives up after the usual D-Bus timeout.
+    While waiting, only the replies are dispatched: they come in on a main
+    context of their own, so no other event handlers run in the meantime.
+    """
+
+    from gi.repository import Gio
+    bus = getAccessibilityBus()
+    context = GLib.MainContext.new()
+    replies = [None] * len(calls)
+    pending = [len(calls)]
+
+    def finish(connection, result, i):
+        try:
+            replies[i] = connection.call_finish(result)
+        except GLib.GError as error:
+            debug_log("%s.%s on %s failed: %s" % (calls[i][2], calls[i][3], calls[i][1], error.message))
+        pending[0] -= 1
+
+    context.push_thread_default()
+    try:
+        for i, (busName, objectPath, interface, method, arguments) in enumerate(calls):
+            bus.call(busName, objectPath, interface, method, arguments, None,
+                     Gio.DBusCallFlags.NONE, -1, None, finish, i)
+    finally:
+        context.pop_thread_default()
+
+    while pending[0]:
+        context.iteration(True)
+    return replies
+
+
 class Highlight(Gtk.Window):  # pragma: no cover
     """
     Hightlight class used by Blinker. Display a red rectangle corresponding to the Accessibility
@@ -481,6 +700,20 @@ def waitForWindow(name, timeout=30):
         return False
 
 
+def setClipboardText(text):
+    """
+    Put the text on the clipboard and hand it over to the clipboard manager,
+    if there is one. Without a clipboard manager, applications pasting it
+    only get the text while pumpEvents() runs.
+    """
+
+    debug_log("setClipboardText(text=%s)" % text)
+
+    clipboard = Gtk.Clipboard.get(Gdk.SELECTION_CLIPBOARD)
+    clipboard.set_text(text, -1)
+    clipboard.store()
+
+
 def get_current_x_window_position():
     """
     This is a helper to get window possition (top left corner) solely by means of
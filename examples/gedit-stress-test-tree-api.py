@@ -7,10 +7,11 @@ def gedit_stress_test_tree_api():
     run("gedit")
 
     gedit = root.application("gedit")
+    menu = gedit.locate("Menu", "toggle button")
 
     for _ in range(100):
-        gedit.child("Menu", "toggle button").click() # open
-        gedit.child("Menu", "toggle button").click() # close
+        menu.click() # open
+        menu.click() # close
 
         gedit.findChild(lambda x: x.name == "Save" and x.roleName in ("button", "push button")).click()
         gedit.findChild(lambda x: x.name == "Cancel" and x.roleName in ("button", "push button")).click()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+import dogtail.i18n
+
+"""
+Unit tests for the dogtail.i18n module
+"""
+
+
+class TestTranslatableString(unittest.TestCase):
+    def test_literal_match(self):
+        string = dogtail.i18n.TranslatableString("Open (recent)")
+        self.assertTrue(string.matchedBy("Open (recent)"))
+        self.assertTrue(string.matchedBy("Open (recent)\n"))
+        self.assertFalse(string.matchedBy("Open (recent) file"))
+        self.assertFalse(string.matchedBy("open (recent)"))
+        self.assertEqual(string.patternMatches, [])
+
+
+    def test_leading_asterisk_match(self):
+        string = dogtail.i18n.TranslatableString("*Quit")
+        self.assertTrue(string.matchedBy("*Quit"))
+        self.assertFalse(string.matchedBy("Quit"))
+        self.assertEqual(string.literalStrings(), ["*Quit", "*Quit\n"])
+
+
+    def test_pattern_match(self):
+        string = dogtail.i18n.TranslatableString("Save.*")
+        self.assertTrue(string.matchedBy("Save.*"))
+        self.assertTrue(string.matchedBy("Save As"))
+        self.assertTrue(string.matchedBy("Save As\n"))
+        self.assertFalse(string.matchedBy("Don't Save"))
+        self.assertIsNone(string.literalStrings())
+
+
+    def test_pattern_with_parentheses(self):
+        string = dogtail.i18n.TranslatableString("Print (.*)")
+        self.assertTrue(string.matchedBy("Print (all)"))
+        self.assertFalse(string.matchedBy("Print all"))
+
+
+    def test_invalid_pattern(self):
+        string = dogtail.i18n.TranslatableString("[Untitled")
+        self.assertTrue(string.matchedBy("[Untitled"))
+        self.assertRaises(Exception, string.matchedBy, "Untitled")
+
+
+    def test_translations(self):
+        class Db(dogtail.i18n.TranslationDb):
+            def getTranslationsOf(self, srcName):
+                return {"Save": ["Enregistrer"], "Close": ["Fermer.*"]}.get(srcName, [])
+
+        dogtail.i18n.translationDbs.append(Db())
+        try:
+            save = dogtail.i18n.TranslatableString("Save")
+            close = dogtail.i18n.TranslatableString("Close")
+        finally:
+            dogtail.i18n.translationDbs.pop()
+        self.assertTrue(save.matchedBy("Enregistrer"))
+        self.assertTrue(save.matchedBy("Save"))
+        self.assertEqual(save.literalStrings(), ["Enregistrer", "Enregistrer\n", "Save", "Save\n"])
+        self.assertTrue(close.matchedBy("Fermer le document"))
+        self.assertTrue(close.matchedBy("Close"))
+        self.assertIsNone(close.literalStrings())
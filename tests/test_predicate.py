@@ -157,3 +157,69 @@ class TestPredicate(unittest.TestCase):
         self.assertTrue(genericNamedPredicate.satisfiedByNode(dn1))
         self.assertEqual(genericNamedPredicate.makeScriptMethodCall(False), "dialog('dummy name 1')")
         self.assertEqual(genericNamedPredicate.makeScriptVariableName(), 'dummyName1Dlg')
+
+    def test_predicates_literal_names(self):
+        self.assertIsNone(dogtail.predicate.Predicate().literalNames())
+        self.assertIsNone(dogtail.predicate.Predicate().literalIdentifier())
+        self.assertEqual(dogtail.predicate.GenericPredicate(name='Save', roleName='push button').literalNames(),
+                         ['Save', 'Save\n'])
+        self.assertEqual(dogtail.predicate.IsAButtonNamed('Open (recent)').literalNames(),
+                         ['Open (recent)', 'Open (recent)\n'])
+        self.assertEqual(dogtail.predicate.IsAMenuItemNamed('*Quit').literalNames(), ['*Quit', '*Quit\n'])
+        self.assertIsNone(dogtail.predicate.GenericPredicate(name='Save.*').literalNames())
+        self.assertIsNone(dogtail.predicate.GenericPredicate(roleName='push button').literalNames())
+        self.assertIsNone(dogtail.predicate.GenericPredicate(name='Save', label='File').literalNames())
+        self.assertEqual(dogtail.predicate.GenericPredicate(identifier='save').literalIdentifier(), 'save')
+        self.assertIsNone(dogtail.predicate.GenericPredicate(identifier='save', label='File').literalIdentifier())
+
+    def test_predicates_combined(self):
+        ok = self.DummyNode('OK', 'push button')
+        cancel = self.DummyNode('Cancel', 'push button')
+        label = self.DummyNode('OK', 'label')
+        okButton = dogtail.predicate.GenericPredicate(name='OK', roleName='push button')
+        cancelButton = dogtail.predicate.IsAButtonNamed('Cancel')
+
+        either = okButton | cancelButton
+        self.assertTrue(either.satisfiedByNode(ok))
+        self.assertTrue(either.satisfiedByNode(cancel))
+        self.assertFalse(either.satisfiedByNode(label))
+        self.assertEqual(sorted(either.roleNames), ['button', 'push button'])
+        self.assertEqual(either.literalNames(), ['OK', 'OK\n', 'Cancel', 'Cancel\n'])
+
+        notOk = dogtail.predicate.IsNamed('OK') & ~dogtail.predicate.GenericPredicate(roleName='push button')
+        self.assertTrue(notOk.satisfiedByNode(label))
+        self.assertFalse(notOk.satisfiedByNode(ok))
+        self.assertIsNone(notOk.roleNames)
+        self.assertEqual(notOk.literalNames(), ['OK', 'OK\n'])
+        self.assertEqual(notOk.describeSearchResult(), "(not child with roleName='push button' and named 'OK')")
+
+        self.assertEqual(
+            (dogtail.predicate.IsAMenuItemNamed('Quit') & dogtail.predicate.IsAButtonNamed('Quit')).roleNames, ())
+        self.assertTrue(dogtail.predicate.prunesSubtrees(
+            dogtail.predicate.IsAnApplicationNamed('gedit') & dogtail.predicate.IsNamed('x')))
+        self.assertFalse(dogtail.predicate.prunesSubtrees(
+            dogtail.predicate.IsAnApplicationNamed('gedit') | dogtail.predicate.IsNamed('x')))
+
+    def test_predicates_cost_order(self):
+        labelled = dogtail.predicate.IsLabelledAs('Name')
+        window = dogtail.predicate.IsAWindow()
+        named = dogtail.predicate.IsNamed('Name')
+        combined = dogtail.predicate.And(labelled, named, window)
+        self.assertEqual(combined.predicates, (window, named, labelled))
+        self.assertLess(window.cost(), named.cost())
+        self.assertLess(named.cost(), labelled.cost())
+
+        checked = []
+        node = self.DummyNode('x', 'frame')
+
+        class Recording(dogtail.predicate.Predicate):
+
+            def __init__(self, cost, result):
+                self.satisfiedByNode = lambda node: checked.append(cost) or result
+                self.cost = lambda: cost
+
+            def describeSearchResult(self):
+                return 'costing %s' % self.cost()
+
+        dogtail.predicate.And(Recording(3, False), Recording(1, False)).satisfiedByNode(node)
+        self.assertEqual(checked, [1])
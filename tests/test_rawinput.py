@@ -5,9 +5,11 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import dogtail.config
 import pyatspi
 from dogtail.rawinput import absoluteMotion, relativeMotion, doubleClick, press, drag, dragWithTrajectory, \
-    pressKey, absoluteMotionWithTrajectory, release, checkCoordinates, click, keyCombo, typeText
+    pressKey, absoluteMotionWithTrajectory, release, checkCoordinates, click, keyCombo, typeText, \
+    parseKeyCombo, keyNameToKeyCode, clearKeymapCache, trajectoryPoints
 from dogtail.tree import SearchError
 from gtkdemotest import GtkDemoTest
+import time
 
 dogtail.config.config.logDebugToFile = False
 dogtail.config.config.logDebugToStdOut = True
@@ -35,6 +37,22 @@ class TestRawinput(GtkDemoTest):
         absoluteMotionWithTrajectory(130, 120, 130, 130)
         absoluteMotionWithTrajectory(130, 130, 150, 100, mouseDelay=0.1)
 
+    def test_motion_with_trajectory_timed(self):
+        start = time.time()
+        absoluteMotionWithTrajectory(10, 10, 1000, 500, duration=0.2, hz=100, easing="easeOut")
+        self.assertLess(time.time() - start, 1)
+        absoluteMotionWithTrajectory(10.5, 10, 10.0, 10, duration=0.2)
+
+    def test_trajectory_points(self):
+        points = trajectoryPoints(0, 0, 1500, 300, 36, "easeInOut")
+        self.assertEqual(len(points), 36)
+        self.assertEqual(points[-1], (1500, 300))
+        self.assertLess(points[1][0] - points[0][0], points[18][0] - points[17][0])
+        self.assertEqual(trajectoryPoints(0, 0, 3, 0, 10), [(1, 0), (2, 0), (3, 0)])
+        with self.assertRaises(ValueError) as context:
+            trajectoryPoints(0, 0, 3, 0, 10, "bouncy")
+        self.assertIn("easeInOut", str(context.exception))
+
     def test_check_coordinates_direct(self):
         checkCoordinates(0, 0)
         checkCoordinates(-0, -0)
@@ -142,6 +160,17 @@ class TestRawinput(GtkDemoTest):
         with self.assertRaises(ValueError):
             keyCombo('<WORK_FASTER_THAN_LIGHTSPEED>')
 
+    def test_parseKeyCombo_cached(self):
+        clearKeymapCache()
+        modifiers, finalCode = parseKeyCombo('<Control><Shift>a')
+        self.assertEqual(modifiers, (keyNameToKeyCode('Control_L'), keyNameToKeyCode('Shift_L')))
+        self.assertEqual(finalCode, keyNameToKeyCode('a'))
+        self.assertEqual(parseKeyCombo('<ctrl><shift>a'), (modifiers, finalCode))
+        parseKeyCombo('<Control><Shift>a')
+        self.assertEqual(parseKeyCombo.cache_info().hits, 1)
+        clearKeymapCache()
+        self.assertEqual(parseKeyCombo.cache_info().currsize, 0)
+
     def test_typeText(self):
         self.runDemo('Clipboard')
         try:
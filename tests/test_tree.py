@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
 import dogtail.config
+import dogtail.path
 import dogtail.predicate
 import dogtail.tree
 import dogtail.rawinput
@@ -146,6 +147,111 @@ class TestNode(GtkDemoTest):
         widget = self.app.child(roleName='tree table')
         self.assertEqual(len(widget.children), 1)
 
+    def test_roleName_table(self):
+        """
+        Node.roleName looked up locally should match the role name the application reports
+        """
+        for node in [self.app] + list(self.app.iterDescendants(maxDepth=4)):
+            self.assertEqual(node.roleName, pyatspi.Atspi.Accessible.get_role_name(node))
+        self.assertIn(pyatspi.ROLE_PAGE_TAB, dogtail.tree.getRolesNamed('page tab'))
+        dogtail.config.config.buttonRoleCompat = True
+        try:
+            self.assertEqual(dogtail.tree.getRolesNamed('button'), [])
+            self.assertIn(pyatspi.ROLE_PUSH_BUTTON, dogtail.tree.getRolesNamed('push button'))
+        finally:
+            dogtail.config.config.reset()
+
+    def test_iterChildren(self):
+        """
+        Node.iterChildren should yield the same children as fetching them one by one
+        """
+        widget = self.app.child(roleName='tree table')
+        expected = [widget[i] for i in range(min(widget.childCount, dogtail.config.config.childrenLimit))]
+        self.assertEqual(list(widget.iterChildren()), expected)
+        self.assertEqual(widget.children, expected)
+        self.assertEqual(next(widget.iterChildren()), expected[0])
+
+    def test_stateSet(self):
+        """
+        Node.stateSet should be fetched once per search attempt and dropped when the node's states change
+        """
+        widget = self.app.child(roleName='tree table')
+        dogtail.config.config.cacheMode = 'validated'
+        try:
+            self.assertIsNot(widget.stateSet, widget.stateSet)
+            with dogtail.tree.holdCache():
+                stateSet = widget.stateSet
+                self.assertIs(widget.stateSet, stateSet)
+                self.assertEqual(stateSet.getStates(), widget.getState().getStates())
+                self.assertEqual(widget.showing, stateSet.contains(pyatspi.STATE_SHOWING))
+                key = (widget.busName, widget.objectPath)
+                dogtail.tree.nodeGenerations[key] = dogtail.tree.nodeGenerations.get(key, 0) + 1
+                self.assertIsNot(widget.stateSet, stateSet)
+        finally:
+            dogtail.config.config.reset()
+
+    def test_cacheMode(self):
+        """
+        Cached values should be read again when out of date, and every time with config.cacheMode "off"
+        """
+        widget = self.app.child(roleName='tree table')
+        children = widget.children
+        self.assertEqual(widget.children, children)
+        self.assertIsNot(widget.children, children)
+        self.assertEqual(dogtail.config.config.cacheMode, 'off')
+        self.assertIsNot(widget.stateSet, widget.stateSet)
+        self.assertEqual(widget.roleName, 'tree table')
+        dogtail.config.config.cacheMode = 'aggressive'
+        try:
+            self.assertEqual(widget.extents, widget.extents)
+            stateSet = widget.stateSet
+            self.assertIs(widget.stateSet, stateSet)
+            busName = widget.busName
+            dogtail.tree.applicationGenerations[busName] = dogtail.tree.applicationGenerations.get(busName, 0) + 1
+            self.assertIs(widget.stateSet, stateSet)
+            self.assertIs(widget.children[0], widget.children[0])
+        finally:
+            dogtail.config.config.reset()
+
+    def test_cacheGenerations(self):
+        """
+        Only the events the cache mode needs should be listened to, and generations of nodes
+        that are gone should be forgotten
+        """
+        dogtail.config.config.cacheMode = 'validated'
+        try:
+            widget = self.app.child(roleName='tree table')
+            self.assertNotIn('object:children-changed', dogtail.tree.cacheWatcher.eventTypes)
+        finally:
+            dogtail.config.config.reset()
+        dogtail.tree.watchCache()
+        self.assertIsNone(dogtail.tree.cacheWatcher)
+        gone = ('no.such.application', '/org/a11y/atspi/accessible/1')
+        dogtail.tree.nodeGenerations[gone] = 1
+        dogtail.tree.nodeGenerations[widget.key] = 1
+        dogtail.tree.pruneCacheGenerations()
+        self.assertNotIn(gone, dogtail.tree.nodeGenerations)
+        self.assertEqual(dogtail.tree.nodeGenerations[widget.key], 1)
+
+    def test_key(self):
+        """
+        Nodes should compare and hash by their key, which nodeFromKey turns back into the node
+        """
+        widget = self.app.child(roleName='tree table')
+        self.assertEqual(widget.key, (self.app.busName, widget.objectPath))
+        self.assertEqual(hash(widget), hash(widget.key))
+        again = self.app.child(roleName='tree table')
+        self.assertEqual(widget, again)
+        self.assertEqual(len({widget, again, self.app}), 2)
+        self.assertNotEqual(widget, self.app)
+        self.assertEqual(dogtail.tree.nodeFromKey(widget.key), widget)
+        self.assertEqual(dogtail.tree.nodeFromKey(self.app.key), self.app)
+        cell = widget.findChild(dogtail.predicate.GenericPredicate(roleName='table cell'))
+        del dogtail.tree.knownNodes[cell.key]
+        self.assertEqual(dogtail.tree.nodeFromKey(cell.key), cell)
+        self.assertRaises(dogtail.tree.SearchError, dogtail.tree.nodeFromKey,
+                          (self.app.busName, '/org/a11y/atspi/accessible/nonexistent'))
+
     #  combovalue (string):
     def test_get_combo_value(self):
         self.runDemo('Combo Boxes')
@@ -206,6 +312,53 @@ class TestNode(GtkDemoTest):
         # FIXME: should have a test case involving the complex GtkTextView
         # widget
 
+    def test_typeText_events(self):
+        """
+        Typing paced by the entry's text events should type the whole string
+        """
+        try:
+            self.runDemo('Dialog and Message Boxes', retry=False)
+            wnd = self.app.child('Dialogs', roleName='frame', retry=False)
+        except dogtail.tree.SearchError:
+            self.runDemo('Dialogs and Message Boxes', retry=False)
+            wnd = self.app.child('Dialogs and Message Boxes', roleName='frame', retry=False)
+        wnd.button('Interactive Dialog').click()
+        entry = self.app.dialog('Interactive Dialog').child(label='Entry 1')
+
+        dogtail.config.config.typingMode = "events"
+        try:
+            self.assertTrue(entry.typeText("The quick brown fox jumps over the lazy dog", verify=True))
+        finally:
+            dogtail.config.config.typingMode = "delay"
+        self.assertEqual(entry.text, "The quick brown fox jumps over the lazy dog")
+
+    def test_typeText_methods(self):
+        """
+        Text inserted, pasted or typed with the automatic choice should all
+        end up in the entries
+        """
+        try:
+            self.runDemo('Dialog and Message Boxes', retry=False)
+            wnd = self.app.child('Dialogs', roleName='frame', retry=False)
+        except dogtail.tree.SearchError:
+            self.runDemo('Dialogs and Message Boxes', retry=False)
+            wnd = self.app.child('Dialogs and Message Boxes', roleName='frame', retry=False)
+        wnd.button('Interactive Dialog').click()
+        dlg = self.app.dialog('Interactive Dialog')
+        entry1 = dlg.child(label='Entry 1')
+        entry2 = dlg.child(label='Entry 2')
+
+        entry1.typeText("inserted", method="insert")
+        self.assertEqual(entry1.text, "inserted")
+        entry1.typeText(" and more" * 10, method="auto")
+        self.assertEqual(entry1.text, "inserted" + " and more" * 10)
+
+        self.assertTrue(entry2.typeText("pasted", method="paste", verify=True))
+        self.assertEqual(entry2.text, "pasted")
+
+        with self.assertRaises(ValueError):
+            entry2.typeText("nothing", method="telepathy")
+
     def test_text_set_error(self):
         with self.assertRaises(AttributeError):
             self.app.text = 'something'
@@ -678,6 +831,181 @@ class TestSearching(GtkDemoTest):
         pageTabs = pageTabList[0].findChildren(lambda x: x.roleName == 'page tab')
         self.assertEqual(len(pageTabs), 5)
 
+    def test_findChildren_collection(self):
+        """
+        Ensure that searching through the Collection interface finds the same nodes as walking the tree
+        """
+        pred = dogtail.predicate.GenericPredicate(roleName='page tab')
+        matched = self.app.findChildren(pred)
+        first = self.app.findChild(pred)
+        dogtail.config.config.searchCollection = False
+        try:
+            self.assertEqual(matched, self.app.findChildren(pred))
+            self.assertEqual(first, self.app.findChild(pred))
+        finally:
+            dogtail.config.config.searchCollection = True
+
+    def test_findChild_order_and_depth(self):
+        """
+        Ensure that breadth-first and depth-limited searches find the expected nodes, both
+        through the Collection interface and when walking the tree
+        """
+        def depth(node):
+            levels = 0
+            while node != self.app:
+                node = node.parent
+                levels += 1
+            return levels
+
+        pred = dogtail.predicate.GenericPredicate(roleName='page tab')
+        try:
+            for useCollection in (True, False):
+                dogtail.config.config.searchCollection = useCollection
+                dfs = self.app.findChildren(pred, order='dfs')
+                bfs = self.app.findChildren(pred, order='bfs')
+                self.assertEqual(len(dfs), len(bfs))
+                self.assertTrue(all(node in dfs for node in bfs))
+                self.assertEqual([depth(node) for node in bfs], sorted(depth(node) for node in bfs))
+                self.assertEqual(depth(self.app.findChild(pred, order='bfs')), depth(bfs[0]))
+                self.assertEqual(self.app.findChildren(pred, maxDepth=depth(bfs[0]) - 1), [])
+                self.assertIsNone(self.app.findChild(pred, maxDepth=depth(bfs[0]) - 1, retry=False, requireResult=False))
+                self.assertEqual(self.app.findChildren(dogtail.predicate.GenericPredicate(roleName='frame'), maxDepth=1),
+                                 self.app.findChildren(dogtail.predicate.GenericPredicate(roleName='frame'), recursive=False))
+        finally:
+            dogtail.config.config.reset()
+
+    def test_findChildren_pruning(self):
+        """
+        Ensure that searches don't descend below the nodes a predicate prunes
+        """
+        class FramePruningPredicate(dogtail.predicate.GenericPredicate):
+            def prunes(self, node):
+                return node.roleName == 'frame'
+
+        self.assertTrue(self.app.findChildren(dogtail.predicate.GenericPredicate(roleName='page tab')))
+        self.assertEqual(self.app.findChildren(FramePruningPredicate(roleName='page tab')), [])
+        self.assertIsNone(self.app.findChild(FramePruningPredicate(roleName='page tab'), retry=False, requireResult=False))
+        self.assertEqual(self.app.findChildren(FramePruningPredicate(roleName='frame')),
+                         self.app.findChildren(dogtail.predicate.GenericPredicate(roleName='frame')))
+
+    def test_application_index(self):
+        """
+        Ensure that searches find the same nodes through the application index as by walking the tree
+        """
+        tabs = self.app.findChildren(dogtail.predicate.GenericPredicate(roleName='page tab'))
+        index = self.app.index()
+        try:
+            self.assertIs(self.app.index(), index)
+            self.assertIn(tabs[0], index.lookup(name=tabs[0].name, roleName='page tab'))
+            self.assertIn(tabs[0], index.lookup(name=tabs[0].name))
+            self.assertEqual(index.lookup(name='thisIsNotAChild'), [])
+            self.assertEqual(self.app.child(tabs[0].name, roleName='page tab'), tabs[0])
+            self.assertEqual(self.app.tab(tabs[0].name), tabs[0])
+            self.assertFalse(self.app.isChild('thisIsNotAChild', roleName='page tab'))
+        finally:
+            index.close()
+        self.assertNotIn(self.app.busName, dogtail.tree.applicationIndexes)
+
+    def test_prefetch(self):
+        """
+        Ensure that prefetched properties match the ones read from the node, and that searches
+        prefetching them find the same nodes
+        """
+        pred = dogtail.predicate.GenericPredicate(roleName='page tab')
+        tab = self.app.findChild(pred)
+        prefetched = tab.prefetch(('name', 'roleName', 'description', 'childCount', 'states'))
+        self.assertEqual(prefetched.name, tab.name)
+        self.assertEqual(prefetched.roleName, tab.roleName)
+        self.assertEqual(prefetched.description, tab.description)
+        self.assertEqual(prefetched.childCount, tab.childCount)
+        self.assertEqual(prefetched.showing, tab.showing)
+        self.assertEqual(prefetched, tab)
+        self.assertTrue(pred.satisfiedByNode(prefetched))
+        self.assertRaises(ValueError, tab.prefetch, ('parent',))
+
+        tabs = self.app.findChildren(pred)
+        self.assertEqual([x.name for x in dogtail.tree.prefetchAll(tabs, ('name',))], [x.name for x in tabs])
+
+        matched = self.app.findChildren(pred, showingOnly=True)
+        dogtail.config.config.searchCollection = False
+        dogtail.config.config.searchPrefetch = True
+        try:
+            self.assertEqual(self.app.findChildren(pred, showingOnly=True), matched)
+            self.assertEqual(self.app.findChild(pred, showingOnly=True), matched[0])
+        finally:
+            dogtail.config.config.reset()
+
+    def test_findMany(self):
+        """
+        Ensure that findMany finds the same nodes as separate findChild calls, and lists the missing targets
+        """
+        targets = {'builder': dogtail.predicate.GenericPredicate(name='Builder'),
+                   'tab': dogtail.predicate.GenericPredicate(roleName='page tab'),
+                   'app': lambda x: x.roleName == 'table cell' and x.name == 'Assistant'}
+        found = self.app.findMany(targets)
+        self.assertEqual(sorted(found), ['app', 'builder', 'tab'])
+        for name, pred in targets.items():
+            self.assertEqual(found[name], self.app.findChild(pred))
+        targets['missing'] = dogtail.predicate.GenericPredicate(name='This does not exist')
+        found = self.app.findMany(targets, retry=False, requireResult=False)
+        self.assertIsNone(found['missing'])
+        self.assertEqual(found['builder'], self.app.child('Builder'))
+        with self.assertRaises(dogtail.tree.SearchError) as context:
+            self.app.findMany(targets, retry=False)
+        self.assertIn('missing', str(context.exception))
+        self.assertNotIn('builder', str(context.exception))
+
+    def test_findMany_events(self):
+        """
+        Ensure that findMany with searchWaitMode "events" retries on events and gives up like findChild
+        """
+        targets = {'builder': dogtail.predicate.GenericPredicate(name='Builder'),
+                   'missing': dogtail.predicate.GenericPredicate(name='This does not exist')}
+        dogtail.config.config.searchWaitMode = 'events'
+        dogtail.config.config.searchCutoffCount = 2
+        try:
+            start = time.time()
+            found = self.app.findMany(targets, requireResult=False)
+            self.assertTrue(time.time() - start < 5)
+            self.assertEqual(found['builder'], self.app.child('Builder'))
+            self.assertIsNone(found['missing'])
+        finally:
+            dogtail.config.config.reset()
+
+    def test_iterDescendants(self):
+        """
+        Ensure that iterDescendants yields the nodes findChildren finds, in the same order, and can stop early
+        """
+        pred = dogtail.predicate.GenericPredicate(roleName='page tab')
+        dogtail.config.config.searchCollection = False
+        try:
+            self.assertEqual(list(self.app.iterDescendants(pred)), self.app.findChildren(pred))
+            self.assertEqual(list(self.app.iterDescendants(pred, order='bfs', maxDepth=1)),
+                             self.app.findChildren(pred, order='bfs', maxDepth=1))
+        finally:
+            dogtail.config.config.reset()
+        descendants = self.app.iterDescendants()
+        self.assertEqual(next(descendants), self.app.children[0])
+        self.assertEqual(next(descendants).parent, self.app.children[0])
+
+    def test_snapshot(self):
+        """
+        Ensure that searching a snapshot finds the same nodes as searching the live tree
+        """
+        pred = dogtail.predicate.GenericPredicate(roleName='page tab')
+        snapshot = self.app.snapshot()
+        self.assertEqual(snapshot.root.roleName, 'application')
+        self.assertEqual(snapshot.root.live, self.app)
+        matched = snapshot.findAll(pred)
+        self.assertEqual([record.live for record in matched], self.app.findChildren(pred))
+        self.assertEqual(snapshot.find(pred).live, self.app.findChild(pred))
+        self.assertEqual(snapshot.find(pred).name, self.app.findChild(pred).name)
+        self.assertIsNone(snapshot.find(dogtail.predicate.GenericPredicate(name='thisIsNotAChild')))
+        with self.assertRaises(AttributeError):
+            matched[0].name = 'changed'
+        showing = snapshot.findAll(lambda x: x.getState().contains(pyatspi.STATE_SHOWING))
+        self.assertEqual(len(showing), len([record for record in snapshot if record.showing]))
+
     def test_findChildren_lambdas(self):
         """
         Ensure that the lambda usage works as expected in Node.findChildren
@@ -703,6 +1031,21 @@ class TestSearching(GtkDemoTest):
         self.assertEqual(texts2[1].roleName, 'text')
         self.assertTrue(texts2[1].showing)
 
+    def test_findChild_waiting_for_events(self):
+        """
+        Ensure that findChild finds nodes that appear later when waiting for events
+        """
+        dogtail.config.config.searchWaitMode = "events"
+        try:
+            self.runDemo('Builder')
+            wnd = self.app.findChild(lambda x: x.roleName == 'frame' and x.name in ('Builder', 'GtkBuilder demo'),
+                                     recursive=False)
+            self.assertIsNotNone(wnd)
+            dogtail.config.config.searchCutoffCount = 2
+            self.assertRaises(dogtail.tree.SearchError, self.app.child, 'thisIsNotAChild')
+        finally:
+            dogtail.config.config.reset()
+
     def test_findAncestor(self):
         pred = dogtail.predicate.GenericPredicate(roleName='table cell')
         child = self.app.child("Builder")
@@ -737,6 +1080,63 @@ class TestSearching(GtkDemoTest):
             "{/('gtk3-demo' application,False)/('Application Class' window,False)/(child with name='Builder' "
             "roleName='table cell',True)}")
 
+    def test_absoluteSearchPath_cached(self):
+        """
+        Search paths should be reused until a node they were derived from changes, and
+        modifying a returned path should not affect the cached one
+        """
+        dogtail.config.config.cacheMode = 'aggressive'
+        try:
+            builder = self.app.child("Builder")
+            builder_sp = builder.getAbsoluteSearchPath()
+            self.assertIs(builder.getRelativeSearch()[1], builder.getRelativeSearch()[1])
+            builder_sp.append(dogtail.predicate.IsNamed('x'), False)
+            self.assertEqual(builder.getAbsoluteSearchPath().length(), 3)
+            key = builder.parent.key
+            dogtail.tree.nodeGenerations[key] = dogtail.tree.nodeGenerations.get(key, 0) + 1
+            self.assertEqual(str(builder.getAbsoluteSearchPath()),
+                             "{/('gtk3-demo' application,False)/('Application Class' window,False)/(child with name='Builder' "
+                             "roleName='table cell',True)}")
+        finally:
+            dogtail.config.config.reset()
+
+    def test_replay_search_path(self):
+        """
+        Replaying a search path should find the node it was made for, following the child
+        index hints or searching where they don't lead to a match
+        """
+        builder = self.app.child("Builder")
+        builder_sp = builder.getAbsoluteSearchPath()
+        self.assertEqual(builder_sp.getHint(0), (self.app.indexInParent,))
+        self.assertEqual(builder_sp.replay(), builder)
+        broken = dogtail.path.SearchPath()
+        for i, (pred, isRecursive) in enumerate(builder_sp):
+            hint = builder_sp.getHint(i)
+            broken.append(pred, isRecursive, [index + 1 for index in hint] if hint else None)
+        self.assertEqual(broken.replay(), builder)
+        self.assertEqual(builder_sp.getPrefix(2).replay(), builder.getRelativeSearch()[0])
+
+    def test_locate(self):
+        """
+        A Locator should search only when first used and act like the node it found
+        """
+        window = self.app.locate('Application Class', roleName='window')
+        builder = window.locate('Builder')
+        self.assertIsNone(builder._node)
+        self.assertEqual(builder.roleName, 'table cell')
+        found = builder._node
+        self.assertEqual(found, self.app.child('Builder'))
+        self.assertIs(builder.resolve(), found)
+        self.assertEqual(builder.parent, found.parent)
+        self.assertEqual(builder.debugName, found.debugName)
+        self.assertEqual(window.resolve(), builder.getRelativeSearch()[0])
+        missing = self.app.locate('This does not exist', roleName='push button')
+        dogtail.config.config.searchCutoffCount = 1
+        try:
+            self.assertRaises(dogtail.tree.SearchError, missing.click)
+        finally:
+            dogtail.config.config.reset()
+
     def test_compare_equal_search_paths(self):
         builder = self.app.child("Builder")
         builder_sp = builder.getAbsoluteSearchPath()
@@ -848,6 +1248,32 @@ class TestSearching(GtkDemoTest):
         self.assertIsNotNone(wnd.childLabelled("Entry 1"))
         self.assertIsNotNone(wnd.button("Message Dialog"))
 
+    def test_label_index(self):
+        """
+        Labelled nodes should be found through the window's label index, like when walking the tree
+        """
+        try:
+            self.runDemo('Dialog and Message Boxes', retry=False)
+            wnd = self.app.child('Dialogs', roleName='frame', retry=False)
+        except dogtail.tree.SearchError:
+            self.runDemo('Dialogs and Message Boxes', retry=False)
+            wnd = self.app.child('Dialogs and Message Boxes', roleName='frame', retry=False)
+        walked = wnd.childLabelled("Entry 1")
+        self.assertNotIn(wnd.key, dogtail.tree.labelIndexes)
+        index = wnd.labelIndex()
+        try:
+            self.assertIs(wnd.labelIndex(), index)
+            self.assertIsNotNone(dogtail.tree.labelIndexWatcher)
+            self.assertEqual(index.window, wnd)
+            self.assertEqual(walked.topLevel(), wnd)
+            self.assertIn(walked, index.lookup("Entry 1"))
+            self.assertEqual(wnd.childLabelled("Entry 1"), walked)
+            self.assertEqual(self.app.child(label="Entry 1"), walked)
+        finally:
+            index.close()
+        self.assertNotIn(wnd.key, dogtail.tree.labelIndexes)
+        self.assertIsNone(dogtail.tree.labelIndexWatcher)
+
 
 # A painful point of collision between strings in python2 and python3!
 @unittest.skipIf(os.system('ls /usr/bin/gedit') != 0, "Skipping, need gedit")
@@ -126,6 +126,27 @@ class TestDelay(unittest.TestCase):
         dogtail.utils.config.debugSleep = False
 
 
+    def test_doSyncDelay_events(self):
+        dogtail.utils.config.syncMode = "events"
+        try:
+            start = time.time()
+            dogtail.utils.doSyncDelay(2.0, busName="no.such.application")
+            self.assertTrue(time.time() - start < 2.0)
+        finally:
+            dogtail.utils.config.syncMode = "delay"
+
+
+class TestWaitForIdle(GtkDemoTest):
+    def test_waitForIdle(self):
+        self.assertTrue(self.app.waitForIdle(quietPeriod=0.05, timeout=5))
+
+
+    def test_waitForIdle_timeout(self):
+        start = time.time()
+        self.assertFalse(self.app.waitForIdle(quietPeriod=10, timeout=0.5))
+        self.assertTrue(time.time() - start < 5)
+
+
 class TestA11Y(unittest.TestCase):
     def test_bail_when_a11y_disabled(self):
         self.assertRaises(SystemExit, dogtail.utils.bailBecauseA11yIsDisabled)